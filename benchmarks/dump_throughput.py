@@ -0,0 +1,70 @@
+"""
+Compares the dump throughput of the yaml and json output formats of XYmlFile.save.
+
+Usage::
+
+    python benchmarks/dump_throughput.py [--services 200] [--ports 50] [--repeat 3]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from yaml_extender.xyml_file import OUTPUT_FORMATS, XYmlFile
+
+WORKLOAD = """
+services: [{services}]
+ports: [{ports}]
+labels:
+  team: platform
+  tier: backend
+  owner: ops@example.com
+deployments:
+  xyml.for: service:services, port:ports
+  xyml.content:
+    name: svc-{{{{service}}}}-{{{{port}}}}
+    port: "{{{{port}}}}"
+    image: registry.example.com/svc-{{{{service}}}}:latest
+    labels: "{{{{labels}}}}"
+    args:
+    - --port={{{{port}}}}
+    - --verbose
+"""
+
+
+def write_workload(directory: Path, services: int, ports: int) -> Path:
+    path = directory / "workload.yaml"
+    path.write_text(
+        WORKLOAD.format(
+            services=", ".join(str(i) for i in range(services)), ports=", ".join(str(8000 + i) for i in range(ports))
+        )
+    )
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--services", type=int, default=200)
+    parser.add_argument("--ports", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        directory = Path(tmp_dir)
+        xyml_file = XYmlFile(write_workload(directory, args.services, args.ports))
+        print(f"Workload: {len(xyml_file.content['deployments'])} expanded deployments")
+        for output_format in OUTPUT_FORMATS:
+            output = directory / f"output.{output_format}"
+            durations = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                xyml_file.save(output, output_format=output_format)
+                durations.append(time.perf_counter() - start)
+            size = output.stat().st_size / 1e6
+            best = min(durations)
+            print(f"{output_format:>5}: {best:8.3f} s  {size:8.2f} MB  {size / best:8.2f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,12 @@
 __version__ = "0.3.1"
 
-from yaml_extender.xyml_file import XYmlFile  # noqa: F401
+__all__ = ["XYmlFile"]
+
+
+def __getattr__(name: str):
+    # XYmlFile pulls in PyYAML and all resolvers, so it is only imported on first access
+    if name == "XYmlFile":
+        from yaml_extender.xyml_file import XYmlFile
+
+        return XYmlFile
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,118 @@
+"""
+Precompiled .xymlc artifacts.
+
+An artifact contains a document with all includes, loops, inline loops and document internal references resolved.
+Only references to xyml.param and xyml.env are kept. Every string containing such a reference is pre-tokenized,
+so rendering an artifact with parameters neither parses yaml nor walks the document.
+
+Artifacts are stored using pickle, only load artifacts from trusted sources.
+"""
+
+from __future__ import annotations
+
+import pickle
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from yaml_extender.frozen import thaw_path
+from yaml_extender.resolver.reference_resolver import ReferenceResolver
+
+ARTIFACT_SUFFIX = ".xymlc"
+ARTIFACT_MAGIC = b"XYMLC"
+ARTIFACT_VERSION = 1
+
+# Location of a string within the document and its parsed references
+Template = Tuple[Tuple[Any, ...], List]
+
+
+class ArtifactCache:
+    """Keeps the data of artifacts in memory and reads them again, when their modification time or size changed"""
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[Tuple[int, int], bytes]] = {}
+        self._lock = threading.Lock()
+
+    def read(self, path: Path) -> bytes:
+        path = Path(path).absolute()
+        stat = path.stat()
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(str(path))
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        data = path.read_bytes()
+        with self._lock:
+            self._entries[str(path)] = (version, data)
+        return data
+
+
+def compile_file(filepath: Path, output: Path, include_dirs: List[Path] | None = None, **kwargs):
+    """
+    Resolves everything in filepath, which does not depend on parameters or environment and saves it as artifact.
+    Additional keyword arguments are passed to XYmlFile.
+    """
+    from yaml_extender.xyml_file import XYmlFile
+
+    xyml_file = XYmlFile(filepath, None, include_dirs, resolve_runtime_refs=False, **kwargs)
+    Path(output).write_bytes(dumps(xyml_file.content))
+
+
+def dumps(content: Any) -> bytes:
+    """Serializes already resolved content into an artifact"""
+    artifact = {"content": content, "templates": tokenize(content)}
+    return ARTIFACT_MAGIC + bytes([ARTIFACT_VERSION]) + pickle.dumps(artifact, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def loads(data: bytes) -> Tuple[Any, List[Template]]:
+    """Returns content and templates of an artifact"""
+    header_size = len(ARTIFACT_MAGIC) + 1
+    if data[: len(ARTIFACT_MAGIC)] != ARTIFACT_MAGIC:
+        raise ValueError("Data is no xyml artifact.")
+    if data[len(ARTIFACT_MAGIC)] != ARTIFACT_VERSION:
+        raise ValueError(f"Unsupported artifact version {data[len(ARTIFACT_MAGIC)]}, please recompile.")
+    artifact = pickle.loads(data[header_size:])
+    return artifact["content"], artifact["templates"]
+
+
+def tokenize(content: Any) -> List[Template]:
+    """Returns all strings within content, which contain references, in document order"""
+    templates = []
+    _collect_templates(content, (), templates)
+    return templates
+
+
+def _collect_templates(value: Any, path: Tuple[Any, ...], templates: List[Template]):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            _collect_templates(v, path + (k,), templates)
+    elif isinstance(value, list):
+        for i, x in enumerate(value):
+            _collect_templates(x, path + (i,), templates)
+    elif isinstance(value, str) and "{{" in value:
+        templates.append((path, ReferenceResolver.parse_references(value)))
+
+
+def render(data: bytes, params: Dict | None = None) -> Any:
+    """Returns the content of an artifact with all parameter and environment references resolved"""
+    from yaml_extender.xyml_file import reference_config
+
+    content, templates = loads(data)
+    if not templates:
+        return content
+    config = reference_config(content, params)
+    ref_resolver = ReferenceResolver(False)
+    # Templates are replaced from the end, so resolved lists can be spliced into lists without shifting paths
+    for path, references in reversed(templates):
+        if not path:
+            return ref_resolver.resolve_reference(content, config, references=references)
+        # Artifacts may contain frozen nodes, which are copied along the path only
+        content, container = thaw_path(content, path[:-1])
+        key = path[-1]
+        value = ref_resolver.resolve_reference(container[key], config, references=references)
+        if isinstance(container, list) and isinstance(value, list):
+            # Keep list flat, like the ReferenceResolver does
+            container[key : key + 1] = value
+        else:
+            container[key] = value
+    return content
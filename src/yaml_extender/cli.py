@@ -1,35 +1,332 @@
+from __future__ import annotations
+
 import argparse
+import logging
+import os
 import sys
 
 from pathlib import Path
 from typing import List, Dict
 
 from yaml_extender import yaml_loader
-from yaml_extender.xyml_file import XYmlFile
-from yaml_extender.logger import get_logger
+from yaml_extender.logger import get_logger, init_basic_logger
+from yaml_extender.xyml_exception import IncludeCycleError, ReferenceNotFoundError, ResourceLimitError
 
 LOGGER = get_logger()
+LOG_LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR"]
+# Input or output path representing stdin or stdout
+STD_STREAM = Path("-")
+
+
+def main(argv: List[str] | None = None, prefetcher=None, artifact_cache=None) -> int:
+    """
+    Runs the command line interface.
+
+        Parameters:
+            argv: Command line arguments, sys.argv is used if not set
+            prefetcher: IncludePrefetcher shared with previous runs, keeps included files cached
+            artifact_cache: ArtifactCache shared with previous runs, keeps compiled artifacts cached
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    try:
+        if argv and argv[0] in COMMANDS:
+            return COMMANDS[argv[0]](argv[1:])
+        return resolve(argv, prefetcher, artifact_cache)
+    except (ResourceLimitError, IncludeCycleError, ReferenceNotFoundError) as e:
+        LOGGER.error(e.message)
+        return 1
+
+
+def add_log_arguments(parser: argparse.ArgumentParser):
+    log_group = parser.add_mutually_exclusive_group()
+    log_group.add_argument("-q", "--quiet", help="Only log warnings and errors", action="store_true")
+    log_group.add_argument("--log-level", help="Log level of console output", choices=LOG_LEVELS, default="INFO")
+
+
+def init_logging(args: argparse.Namespace):
+    init_basic_logger(logging.WARNING if args.quiet else getattr(logging, args.log_level))
+
+
+def add_limit_arguments(parser: argparse.ArgumentParser):
+    limit_group = parser.add_argument_group("resource limits", "Abort the resolution, if a limit is exceeded")
+    limit_group.add_argument("--max-nodes", help="Maximum number of nodes created by loops", type=int)
+    limit_group.add_argument("--max-output-bytes", help="Maximum size of the output", type=int)
+    limit_group.add_argument("--max-include-depth", help="Maximum nesting depth of included files", type=int)
+    limit_group.add_argument("--timeout", help="Maximum duration of the resolution in seconds", type=float)
+
+
+def get_limits(args: argparse.Namespace):
+    """Returns the ResolveLimits given by the arguments or None, if no limit is set"""
+    from yaml_extender.limits import ResolveLimits
 
+    values = (args.max_nodes, args.max_output_bytes, args.max_include_depth, args.timeout)
+    if all(x is None for x in values):
+        return None
+    return ResolveLimits(*values)
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("input", help="Input yaml file to be parsed", type=Path)
-    parser.add_argument("output", help="Output file to save to", type=Path)
+
+def resolve(argv: List[str], prefetcher=None, artifact_cache=None) -> int:
+    """Resolves an input file or renders a compiled artifact and saves the result"""
+    # Resolution is imported lazily, so that argument parsing and --help stay fast
+    import json
+
+    from yaml_extender.artifact import ARTIFACT_SUFFIX
+    from yaml_extender.tracing import Tracer
+    from yaml_extender.xyml_file import DEFAULT_ANCHOR_MIN_SIZE, XYmlFile
+
+    parser = argparse.ArgumentParser(
+        epilog=f"Further commands: {', '.join(COMMANDS)}. Run them with --help for details."
+    )
+    parser.add_argument(
+        "input", help=f"Input yaml file or compiled {ARTIFACT_SUFFIX} artifact, - reads from stdin", type=Path
+    )
+    parser.add_argument("output", help="Output file to save to, - writes to stdout", type=Path)
     parser.add_argument("-i", "--include", help="Include paths", type=Path, action="append")
     parser.add_argument("--sort-keys", help="When set output file will have keys sorted", action="store_true")
-    args, unknown_args = parser.parse_known_args()
+    parser.add_argument(
+        "--format",
+        help="Format of the output file, independent of its suffix",
+        choices=["yaml", "json"],
+        default="yaml",
+    )
+    parser.add_argument(
+        "--write-if-changed",
+        help="Only replace the output file if its content changed, keeping the modification time otherwise",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--anchors",
+        help="Write equal subtrees with at least MIN_SIZE nodes once and use yaml aliases for repetitions "
+        f"(default size {DEFAULT_ANCHOR_MIN_SIZE})",
+        metavar="MIN_SIZE",
+        type=int,
+        nargs="?",
+        const=DEFAULT_ANCHOR_MIN_SIZE,
+    )
+    parser.add_argument(
+        "--no-aliases",
+        help="Write subtrees shared by reference in full at every occurrence instead of using yaml aliases",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--select",
+        help="Only resolve and write the value at a dotted key path, e.g. services.web, can be given multiple times",
+        metavar="PATH",
+        action="append",
+    )
+    parser.add_argument("--stats", help="Print resolution statistics as JSON to stdout", action="store_true")
+    parser.add_argument("--trace", help="Write a Chrome trace event file of the resolution", type=Path)
+    parser.add_argument(
+        "--prefetch-workers",
+        help="Number of threads reading included files concurrently, 0 disables prefetching",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "--parallel-workers",
+        help="Number of processes resolving the top-level values of the input concurrently, 0 resolves serially",
+        type=int,
+        default=0,
+    )
+    add_limit_arguments(parser)
+    add_log_arguments(parser)
+    args, unknown_args = parser.parse_known_args(argv)
+    init_logging(args)
+    output_format = args.format
+    if args.anchors is not None and output_format != "yaml":
+        parser.error("--anchors is only supported for yaml output")
 
-    if not args.input.is_file:
+    if args.input != STD_STREAM and not args.input.is_file:
         raise FileNotFoundError(f"Path {args.input} is no valid file.")
     additional_args = parse_unknown_args(unknown_args)
-    LOGGER.info("Additional parameters:\n" + "\n".join([f"{k}: {v}" for k, v in additional_args.items()]))
-    xyml_file = XYmlFile(args.input, additional_args, args.include)
-    output_dir: Path = args.output.parent
-    output_dir.mkdir(exist_ok=True, parents=True)
-    xyml_file.save(args.output, args.sort_keys)
+    if LOGGER.isEnabledFor(logging.INFO):
+        LOGGER.info("Additional parameters:\n%s", "\n".join([f"{k}: {v}" for k, v in additional_args.items()]))
+    tracer = Tracer() if args.trace else None
+    limits = get_limits(args)
+    options = {
+        "collect_stats": args.stats,
+        "tracer": tracer,
+        "prefetch_workers": args.prefetch_workers,
+        "prefetcher": prefetcher,
+        "limits": limits,
+        "parallel_workers": args.parallel_workers,
+        "select": args.select,
+    }
+    if args.input == STD_STREAM:
+        xyml_file = XYmlFile.from_stream(sys.stdin, additional_args, args.include, **options)
+    elif args.input.suffix == ARTIFACT_SUFFIX:
+        artifact = args.input if artifact_cache is None else artifact_cache.read(args.input)
+        xyml_file = XYmlFile.from_artifact(
+            artifact, additional_args, collect_stats=args.stats, tracer=tracer, limits=limits, select=args.select
+        )
+    else:
+        xyml_file = XYmlFile(args.input, additional_args, args.include, **options)
+    if args.output == STD_STREAM:
+        xyml_file.dump(sys.stdout, args.sort_keys, output_format, args.anchors, not args.no_aliases)
+    else:
+        output_dir: Path = args.output.parent
+        output_dir.mkdir(exist_ok=True, parents=True)
+        written = xyml_file.save(
+            args.output, args.sort_keys, output_format, args.write_if_changed, args.anchors, not args.no_aliases
+        )
+        if args.write_if_changed and written:
+            LOGGER.info("Output %s written", args.output)
+        elif args.write_if_changed:
+            LOGGER.info("Output %s unchanged, not written", args.output)
+    if tracer is not None:
+        tracer.save(args.trace)
+    if args.stats:
+        # Keep stdout clean, if it already contains the output
+        stats_stream = sys.stderr if args.output == STD_STREAM else sys.stdout
+        print(json.dumps(xyml_file.stats.as_dict(), indent=2), file=stats_stream)
+    return 0
+
+
+def compile_artifact(argv: List[str]) -> int:
+    """Compiles an input file into an artifact, which can be rendered quickly with different parameters"""
+    from yaml_extender.artifact import ARTIFACT_SUFFIX, compile_file
+
+    parser = argparse.ArgumentParser(
+        prog="yaml_extender compile",
+        description="Resolves includes, loops and all references, which do not depend on xyml.param or xyml.env, "
+        f"and saves the result as {ARTIFACT_SUFFIX} artifact. Pass the artifact as input to render it.",
+    )
+    parser.add_argument("input", help="Input yaml file to be compiled", type=Path)
+    parser.add_argument("output", help=f"Output {ARTIFACT_SUFFIX} artifact", type=Path)
+    parser.add_argument("-i", "--include", help="Include paths", type=Path, action="append")
+    add_log_arguments(parser)
+    args = parser.parse_args(argv)
+    init_logging(args)
+
+    args.output.parent.mkdir(exist_ok=True, parents=True)
+    compile_file(args.input, args.output, args.include)
+    return 0
+
+
+def get(argv: List[str]) -> int:
+    """Prints a single resolved value of the input"""
+    import json
+
+    from yaml_extender.resolver.reference_resolver import ReferenceResolver
+    from yaml_extender.xyml_file import XYmlFile
+
+    parser = argparse.ArgumentParser(
+        prog="yaml_extender get",
+        description="Resolves only the value at a dotted path, e.g. services.web.ports.0, and the values it "
+        "references, and prints it. Scalars are printed as they are, mappings and lists as yaml or json.",
+    )
+    parser.add_argument("input", help="Input yaml file, - reads from stdin", type=Path)
+    parser.add_argument("path", help="Dotted path of the value, list items are addressed by their index")
+    parser.add_argument("-i", "--include", help="Include paths", type=Path, action="append")
+    parser.add_argument("--format", help="Format of the printed value", choices=["yaml", "json"], default="yaml")
+    parser.add_argument("--sort-keys", help="Sort the keys of printed mappings", action="store_true")
+    add_log_arguments(parser)
+    args, unknown_args = parser.parse_known_args(argv)
+    # The value is the only output, unless more is requested explicitly
+    if not args.quiet and args.log_level == "INFO":
+        args.log_level = "WARNING"
+    init_logging(args)
+
+    additional_args = parse_unknown_args(unknown_args)
+    if args.input == STD_STREAM:
+        xyml_file = XYmlFile.from_stream(sys.stdin, additional_args, args.include, select=[args.path])
+    else:
+        xyml_file = XYmlFile(args.input, additional_args, args.include, select=[args.path])
+    # Same semantics as references to the value
+    value = ReferenceResolver().resolve_subrefs(args.path, xyml_file.content)
+    if isinstance(value, (dict, list)):
+        xyml_file.content = value
+        xyml_file.dump(sys.stdout, args.sort_keys, args.format)
+    elif isinstance(value, str) and args.format == "yaml":
+        print(value)
+    else:
+        print(json.dumps(value, default=str))
     return 0
 
 
+def plan(argv: List[str]) -> int:
+    """Estimates the size of the resolved input without expanding its loops"""
+    import json
+
+    from yaml_extender.planner import plan_file
+
+    parser = argparse.ArgumentParser(
+        prog="yaml_extender plan",
+        description="Resolves the includes of the input and estimates the number of nodes created by its loops "
+        "from the lengths of the iterated lists, without expanding them.",
+    )
+    parser.add_argument("input", help="Input yaml file to be planned", type=Path)
+    parser.add_argument("-i", "--include", help="Include paths", type=Path, action="append")
+    parser.add_argument("--top", help="Number of hotspots to print", type=int, default=10)
+    parser.add_argument("--json", help="Print the plan as JSON", action="store_true")
+    add_log_arguments(parser)
+    args = parser.parse_args(argv)
+    init_logging(args)
+
+    expansion_plan = plan_file(args.input, args.include)
+    if args.json:
+        print(json.dumps(expansion_plan.as_dict(args.top), indent=2))
+    else:
+        print(expansion_plan.format(args.top))
+    return 0
+
+
+def serve(argv: List[str]) -> int:
+    """Runs the resolver daemon until it is interrupted"""
+    from yaml_extender.daemon import DEFAULT_SOCKET_ENV, ResolverDaemon
+    from yaml_extender.resolver.include_prefetcher import DEFAULT_PREFETCH_WORKERS
+
+    parser = argparse.ArgumentParser(
+        prog="yaml_extender serve",
+        description="Serves resolve requests of 'yaml_extender client' on a Unix domain socket. "
+        "Included files and compiled artifacts stay cached between requests, until they change on disk.",
+    )
+    parser.add_argument(
+        "--socket",
+        help=f"Path of the socket, defaults to ${DEFAULT_SOCKET_ENV}",
+        default=os.environ.get(DEFAULT_SOCKET_ENV),
+    )
+    parser.add_argument(
+        "--prefetch-workers",
+        help="Number of threads reading included files concurrently",
+        type=int,
+        default=DEFAULT_PREFETCH_WORKERS,
+    )
+    add_log_arguments(parser)
+    args = parser.parse_args(argv)
+    init_logging(args)
+    if not args.socket:
+        parser.error(f"--socket or ${DEFAULT_SOCKET_ENV} is required")
+
+    with ResolverDaemon(Path(args.socket), args.prefetch_workers) as daemon:
+        LOGGER.info("Listening on %s", args.socket)
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+def client(argv: List[str]) -> int:
+    """Forwards the arguments to a running daemon and writes its output"""
+    from yaml_extender.daemon import DEFAULT_SOCKET_ENV, request
+
+    socket_path = os.environ.get(DEFAULT_SOCKET_ENV)
+    # Only the leading --socket option belongs to the client, everything else is forwarded
+    if len(argv) > 1 and argv[0] == "--socket":
+        socket_path, argv = argv[1], argv[2:]
+    elif argv and argv[0].startswith("--socket="):
+        socket_path, argv = argv[0].split("=", 1)[1], argv[1:]
+    if not socket_path:
+        print(f"yaml_extender client: --socket or ${DEFAULT_SOCKET_ENV} is required", file=sys.stderr)
+        return 2
+    return request(Path(socket_path), argv)
+
+
+COMMANDS = {"compile": compile_artifact, "get": get, "plan": plan, "serve": serve, "client": client}
+
+
 def parse_unknown_args(args: List) -> Dict:
     arg_dict = dict(zip(args[:-1:2], args[1::2]))
     ret_val = {}
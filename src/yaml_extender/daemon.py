@@ -0,0 +1,184 @@
+"""
+Resident resolver daemon.
+
+The daemon listens on a Unix domain socket and runs the command line interface for every request of a client.
+Included files and compiled artifacts are kept in memory between requests and only read again once they change
+on disk, so a client invocation costs a socket round-trip instead of starting Python and parsing all includes.
+
+Requests are served one after another, because every request runs in the working directory and environment of
+its client. The client only depends on the standard library and does not import the resolver.
+
+Protocol: the client sends one JSON line {"argv", "cwd", "env", "stdin"}. The daemon answers with JSON lines
+{"stdout": text} or {"stderr": text} while the command runs, followed by {"exit": code}.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+from pathlib import Path
+from typing import IO, List
+
+DEFAULT_SOCKET_ENV = "XYML_DAEMON_SOCKET"
+# Commands, which must not be run within the daemon
+LOCAL_COMMANDS = ["serve", "client"]
+
+
+def request(
+    socket_path: Path, argv: List[str], stdin: IO | None = None, stdout: IO | None = None, stderr: IO | None = None
+) -> int:
+    """
+    Runs argv within the daemon listening on socket_path and writes its output.
+
+        Parameters:
+            socket_path: Socket of the daemon
+            argv: Command line arguments, as passed to yaml_extender
+            stdin: Forwarded to the daemon, if argv reads from stdin, defaults to sys.stdin
+            stdout: Receives the standard output of the command, defaults to sys.stdout
+            stderr: Receives the error output of the command, defaults to sys.stderr
+        Returns:
+            Exit code of the command
+    """
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    message = {"argv": list(argv), "cwd": os.getcwd(), "env": dict(os.environ)}
+    if "-" in argv:
+        message["stdin"] = (stdin or sys.stdin).read()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(socket_path))
+        sock.sendall(json.dumps(message).encode() + b"\n")
+        with sock.makefile("r", encoding="utf-8") as responses:
+            for line in responses:
+                response = json.loads(line)
+                if "stdout" in response:
+                    stdout.write(response["stdout"])
+                elif "stderr" in response:
+                    stderr.write(response["stderr"])
+                elif "exit" in response:
+                    stdout.flush()
+                    return response["exit"]
+    stderr.write("yaml_extender client: connection closed by daemon\n")
+    return 1
+
+
+class ResolverDaemon:
+    """Serves resolve requests on a Unix domain socket, while keeping parsed includes and artifacts cached"""
+
+    def __init__(self, socket_path: Path, prefetch_workers: int | None = None):
+        """
+        Parameters
+            socket_path: Path of the socket to listen on, a stale socket file is replaced
+            prefetch_workers: Number of threads reading included files concurrently
+        """
+        from yaml_extender.artifact import ArtifactCache
+        from yaml_extender.resolver.include_prefetcher import DEFAULT_PREFETCH_WORKERS, IncludePrefetcher
+
+        if not hasattr(socketserver, "UnixStreamServer"):
+            raise OSError("Unix domain sockets are not supported on this platform.")
+        self.socket_path: Path = Path(socket_path)
+        _remove_stale_socket(self.socket_path)
+        self.prefetcher = IncludePrefetcher(prefetch_workers or DEFAULT_PREFETCH_WORKERS, validate=True)
+        self.artifact_cache = ArtifactCache()
+        self.request_count: int = 0
+        self._server = socketserver.UnixStreamServer(str(self.socket_path), _RequestHandler)
+        self._server.resolver_daemon = self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def shutdown(self):
+        """Stops serve_forever, must be called from another thread"""
+        self._server.shutdown()
+
+    def close(self):
+        self._server.server_close()
+        self.prefetcher.close()
+        self.socket_path.unlink(missing_ok=True)
+
+    def run(self, message: dict, wfile: IO[bytes]):
+        """Runs the command of a request within the working directory and environment of the client"""
+        self.request_count += 1
+        cwd = os.getcwd()
+        environ = dict(os.environ)
+        streams = sys.stdin, sys.stdout, sys.stderr
+        try:
+            os.chdir(message["cwd"])
+            os.environ.clear()
+            os.environ.update(message.get("env", environ))
+            sys.stdin = io.StringIO(message.get("stdin", ""))
+            sys.stdout = _ResponseStream(wfile, "stdout")
+            sys.stderr = _ResponseStream(wfile, "stderr")
+            exit_code = self.__run(message["argv"])
+        finally:
+            sys.stdin, sys.stdout, sys.stderr = streams
+            os.environ.clear()
+            os.environ.update(environ)
+            os.chdir(cwd)
+        _send(wfile, {"exit": exit_code})
+
+    def __run(self, argv: List[str]) -> int:
+        import traceback
+
+        from yaml_extender import cli
+
+        if argv and argv[0] in LOCAL_COMMANDS:
+            print(f"yaml_extender: '{argv[0]}' cannot be run by the daemon", file=sys.stderr)
+            return 2
+        try:
+            return cli.main(argv, self.prefetcher, self.artifact_cache)
+        except SystemExit as e:
+            # Raised by argparse for --help and invalid arguments
+            return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except Exception:
+            traceback.print_exc()
+            return 1
+
+
+def _remove_stale_socket(socket_path: Path):
+    if not socket_path.exists():
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(socket_path))
+        except OSError:
+            socket_path.unlink()
+            return
+    raise OSError(f"A daemon is already listening on {socket_path}.")
+
+
+def _send(wfile: IO[bytes], response: dict):
+    wfile.write(json.dumps(response).encode() + b"\n")
+    wfile.flush()
+
+
+class _ResponseStream(io.TextIOBase):
+    """Text stream sending everything written to the client"""
+
+    def __init__(self, wfile: IO[bytes], name: str):
+        self._wfile = wfile
+        self._name = name
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if text:
+            _send(self._wfile, {self._name: text})
+        return len(text)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if line:
+            self.server.resolver_daemon.run(json.loads(line), self.wfile)
@@ -0,0 +1,107 @@
+"""
+Immutable document nodes.
+
+Included files are frozen after loading, so their content can be shared by all include sites and loop items
+without copying. Resolvers copy a frozen node only when they modify it, which creates new nodes along modified
+paths while unmodified subtrees stay shared. The resolved content is thawed, unless it is interned or resolved
+thread safe.
+FrozenDict and FrozenList are subclasses of dict and list, so reading code and serialization stay unchanged.
+"""
+
+from __future__ import annotations
+
+import operator
+from typing import Any, Iterable, List, Tuple
+
+
+def _immutable(self, *args, **kwargs):
+    raise TypeError(f"{type(self).__name__} is immutable, thaw it before modifying.")
+
+
+class FrozenDict(dict):
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+
+class FrozenList(list):
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _immutable
+    append = extend = insert = pop = remove = clear = sort = reverse = _immutable
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return FrozenList, (list(self),)
+
+
+def freeze(value: Any) -> Any:
+    """Returns an immutable version of value, already frozen subtrees are reused"""
+    if isinstance(value, (FrozenDict, FrozenList)):
+        return value
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return FrozenList(freeze(x) for x in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Returns a mutable shallow copy of a frozen node, other values are returned unchanged"""
+    if isinstance(value, FrozenDict):
+        return dict(value)
+    if isinstance(value, FrozenList):
+        return list(value)
+    return value
+
+
+def thaw_all(value: Any) -> Any:
+    """
+    Returns value with all frozen nodes replaced by mutable copies.
+    Plain containers are updated in place, every occurrence of a shared frozen node becomes a copy of its own.
+    """
+    if isinstance(value, dict):
+        value = thaw(value)
+        for k, v in value.items():
+            if isinstance(v, (dict, list)):
+                value[k] = thaw_all(v)
+    elif isinstance(value, list):
+        value = thaw(value)
+        for i, x in enumerate(value):
+            if isinstance(x, (dict, list)):
+                value[i] = thaw_all(x)
+    return value
+
+
+def thaw_path(root: Any, path: Iterable) -> Tuple[Any, Any]:
+    """Thaws root and all nodes along path, returns the thawed root and the node at the end of path"""
+    root = node = thaw(root)
+    for key in path:
+        child = thaw(node[key])
+        if child is not node[key]:
+            node[key] = child
+        node = child
+    return root, node
+
+
+def reuse(original: List, items: Iterable) -> List:
+    """Returns original if it is frozen and contains the same items, so unchanged lists stay shared"""
+    items = items if isinstance(items, list) else list(items)
+    if isinstance(original, FrozenList) and len(original) == len(items) and all(map(operator.is_, original, items)):
+        return original
+    return items
@@ -0,0 +1,65 @@
+"""
+Hash-consing of resolved content.
+
+Expanded loops and repeated includes produce many equal strings and structurally identical subtrees.
+Interning replaces all of them by one canonical frozen instance, which reduces the memory held by the content.
+"""
+
+from __future__ import annotations
+
+import operator
+import sys
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+from yaml_extender.frozen import FrozenDict, FrozenList
+
+
+class Interner:
+    """
+    Replaces equal scalars and subtrees by canonical instances.
+    An interner can be used for multiple documents, which then share their canonical nodes, also from multiple threads.
+    """
+
+    def __init__(self):
+        # Canonical instances by type and value, or by type and identity of their canonical children
+        self._nodes: Dict[Tuple, Any] = {}
+        # Number of duplicates replaced by a canonical instance
+        self.duplicates: int = 0
+        # Estimated memory of the replaced duplicates in bytes
+        self.saved_bytes: int = 0
+        self._lock = threading.Lock()
+
+    def intern(self, value: Any) -> Any:
+        """Returns the canonical instance of value, containers are frozen"""
+        if isinstance(value, dict):
+            items = [(self.intern(k), self.intern(v)) for k, v in value.items()]
+            # Children are canonical, so their identity determines the equality of this node
+            key = (FrozenDict, tuple((k, id(v)) for k, v in items))
+            if isinstance(value, FrozenDict) and all(v is value[k] for k, v in items):
+                return self.__canonical(key, value)
+            return self.__canonical(key, value, lambda: FrozenDict(items))
+        if isinstance(value, list):
+            items = [self.intern(x) for x in value]
+            key = (FrozenList, tuple(id(x) for x in items))
+            if isinstance(value, FrozenList) and all(map(operator.is_, value, items)):
+                return self.__canonical(key, value)
+            return self.__canonical(key, value, lambda: FrozenList(items))
+        try:
+            # The type is part of the key, so e.g. 1, 1.0 and True stay distinct
+            return self.__canonical((type(value), value), value)
+        except TypeError:
+            # Unhashable values are kept as they are
+            return value
+
+    def __canonical(self, key: Tuple, value: Any, create: Callable[[], Any] | None = None) -> Any:
+        """Returns the instance registered for key, registers value or the result of create if there is none"""
+        with self._lock:
+            if key not in self._nodes:
+                self._nodes[key] = value if create is None else create()
+                return self._nodes[key]
+            node = self._nodes[key]
+            if node is not value:
+                self.duplicates += 1
+                self.saved_bytes += sys.getsizeof(value)
+            return node
@@ -0,0 +1,105 @@
+"""
+Resource limits of a resolution.
+
+Limits protect shared machines against typos, which would otherwise make a resolution run for minutes and use all
+memory, e.g. an accidental cartesian product in a multi loop. Exceeding a limit aborts the resolution early with a
+ResourceLimitError naming the offending statement.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import IO, Any
+
+from yaml_extender.xyml_exception import ResourceLimitError
+
+
+class ResolveLimits:
+    """Configurable budgets of a resolution, every limit set to None is disabled"""
+
+    def __init__(
+        self,
+        max_nodes: int | None = None,
+        max_output_bytes: int | None = None,
+        max_include_depth: int | None = None,
+        timeout: float | None = None,
+    ):
+        """
+        Parameters
+            max_nodes: Maximum number of nodes created by expanding loops and inline loops
+            max_output_bytes: Maximum size of the saved or dumped output
+            max_include_depth: Maximum nesting depth of included files
+            timeout: Maximum wall-clock time of the resolution in seconds
+        """
+        self.max_nodes: int | None = max_nodes
+        self.max_output_bytes: int | None = max_output_bytes
+        self.max_include_depth: int | None = max_include_depth
+        self.timeout: float | None = timeout
+
+    def __repr__(self):
+        return (
+            f"ResolveLimits(max_nodes={self.max_nodes}, max_output_bytes={self.max_output_bytes}, "
+            f"max_include_depth={self.max_include_depth}, timeout={self.timeout})"
+        )
+
+    def start(self) -> ResolveBudget:
+        """Returns the budget of a new resolution, the timeout starts now"""
+        return ResolveBudget(self)
+
+
+class ResolveBudget:
+    """Tracks the resources used by a single resolution against its limits"""
+
+    def __init__(self, limits: ResolveLimits):
+        self.limits: ResolveLimits = limits
+        self.nodes: int = 0
+        self.deadline: float | None = None if limits.timeout is None else time.monotonic() + limits.timeout
+
+    def add_nodes(self, count: int, statement: Any):
+        """Adds nodes created by statement, fails if the node limit is exceeded"""
+        self.nodes += count
+        if self.limits.max_nodes is not None and self.nodes > self.limits.max_nodes:
+            raise ResourceLimitError(
+                f"Expansion of '{statement}' exceeds the limit of {self.limits.max_nodes} nodes.", statement
+            )
+        self.check_time(statement)
+
+    def check_include_depth(self, depth: int, statement: Any):
+        if self.limits.max_include_depth is not None and depth > self.limits.max_include_depth:
+            raise ResourceLimitError(
+                f"Include '{statement}' exceeds the maximum include depth of {self.limits.max_include_depth}.",
+                statement,
+            )
+
+    def check_time(self, statement: Any):
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise ResourceLimitError(
+                f"Resolution exceeded the timeout of {self.limits.timeout}s while resolving '{statement}'.", statement
+            )
+
+
+def count_nodes(value: Any) -> int:
+    """Returns the number of nodes of value, including nested nodes"""
+    if isinstance(value, dict):
+        return 1 + sum(count_nodes(v) for v in value.values())
+    if isinstance(value, list):
+        return 1 + sum(count_nodes(x) for x in value)
+    return 1
+
+
+class LimitedStream:
+    """Text stream wrapper, which fails once more than max_bytes were written"""
+
+    def __init__(self, stream: IO[str], max_bytes: int):
+        self.stream: IO[str] = stream
+        self.max_bytes: int = max_bytes
+        self.written: int = 0
+
+    def write(self, text: str) -> int:
+        self.written += len(text) if text.isascii() else len(text.encode())
+        if self.written > self.max_bytes:
+            raise ResourceLimitError(f"Output exceeds the limit of {self.max_bytes} bytes.")
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
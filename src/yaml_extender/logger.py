@@ -1,36 +1,53 @@
 import logging
+import sys
+import threading
 
-LOGGER: logging.Logger = None
+LOGGER_NAME = "xyaml_parser"
+LOG_FORMAT = "%(asctime)s: [%(levelname)s]: %(message)s"
+
+# The library only emits records, the application decides about levels and handlers
+LOGGER: logging.Logger = logging.getLogger(LOGGER_NAME)
+LOGGER.addHandler(logging.NullHandler())
+# Serializes the configuration of the console handler
+_CONFIG_LOCK = threading.Lock()
 
 
 def get_logger():
-    if not LOGGER:
-        init_basic_logger()
     return LOGGER
 
 
-def debug(msg: str, **kwargs):
-    get_logger().debug(msg, **kwargs)
+def is_enabled(level: int) -> bool:
+    return LOGGER.isEnabledFor(level)
+
+
+def debug(msg: str, *args, **kwargs):
+    LOGGER.debug(msg, *args, **kwargs)
 
 
-def info(msg: str, **kwargs):
-    get_logger().info(msg, **kwargs)
+def info(msg: str, *args, **kwargs):
+    LOGGER.info(msg, *args, **kwargs)
 
 
-def warning(msg: str, **kwargs):
-    get_logger().warning(msg, **kwargs)
+def warning(msg: str, *args, **kwargs):
+    LOGGER.warning(msg, *args, **kwargs)
 
 
-def error(msg: str, **kwargs):
-    get_logger().error(msg, **kwargs)
+def error(msg: str, *args, **kwargs):
+    LOGGER.error(msg, *args, **kwargs)
 
 
-def init_basic_logger():
-    global LOGGER
-    LOGGER = logging.getLogger("xyaml_parser")
-    LOGGER.setLevel(logging.DEBUG)
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.DEBUG)
-    formatter = logging.Formatter("%(asctime)s: [%(levelname)s]: %(message)s")
-    console_handler.setFormatter(formatter)
-    LOGGER.addHandler(console_handler)
+def init_basic_logger(level: int = logging.INFO):
+    """Adds console output to the logger with the given level, used when running from command line"""
+    with _CONFIG_LOCK:
+        LOGGER.setLevel(level)
+        console_handler = next((h for h in LOGGER.handlers if type(h) is logging.StreamHandler), None)
+        if console_handler is None:
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            LOGGER.addHandler(console_handler)
+        else:
+            # sys.stderr may have been replaced since the handler was created, e.g. by the daemon.
+            # The previous stream may already be closed, so it is not flushed like in setStream.
+            with console_handler.lock:
+                console_handler.stream = sys.stderr
+        console_handler.setLevel(level)
@@ -0,0 +1,196 @@
+"""
+Parallel resolution of the top-level subtrees of a document.
+
+Includes are resolved first. Loops and inline loops, and afterwards references, of every top-level value are then
+resolved in a process pool, or a thread pool on free-threaded python. Each stage reads from a frozen snapshot of the
+document of the previous stage, which is sent once to every worker. References into other subtrees are therefore
+resolved like in a serial resolution.
+"""
+
+from __future__ import annotations
+
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterator, Tuple
+
+from yaml_extender.frozen import freeze
+from yaml_extender.limits import ResolveBudget, ResolveLimits
+import yaml_extender.logger as logger
+from yaml_extender.resolver.inline_loop_resolver import INLINE_LOOP_REGEX, InlineLoopResolver
+from yaml_extender.resolver.loop_resolver import LOOP_KEY, LOOP_REGEX, LoopResolver
+from yaml_extender.resolver.reference_resolver import ReferenceResolver
+from yaml_extender.stats import ResolveStats
+
+# Snapshot of the document, set once per worker process
+_SNAPSHOT: Any = None
+
+
+class SubtreeResult:
+    """Resolved top-level value and the counters of its resolution"""
+
+    def __init__(self, content: Any, stats: ResolveStats | None, budget: ResolveBudget | None):
+        self.content: Any = content
+        self.stats: ResolveStats | None = stats
+        self.nodes: int = budget.nodes if budget is not None else 0
+        self.loop_count: int = 0
+        self.inline_loop_count: int = 0
+
+
+class ParallelResolver:
+    """Resolves loops and references of the top-level values of a document concurrently"""
+
+    def __init__(
+        self,
+        max_workers: int,
+        stats: ResolveStats | None = None,
+        budget: ResolveBudget | None = None,
+        deferred_prefixes: Tuple[str, ...] = (),
+    ):
+        """
+        Parameters
+            max_workers: Number of worker processes or threads
+            stats: Statistics updated with the counters of all workers
+            budget: Budget of the resolution, every worker enforces the limits for its own subtree,
+                    the nodes created by all workers are added up afterwards
+            deferred_prefixes: References starting with one of these prefixes are kept unresolved
+        """
+        self.max_workers: int = max_workers
+        self.stats: ResolveStats | None = stats
+        self.budget: ResolveBudget | None = budget
+        self.deferred_prefixes: Tuple[str, ...] = deferred_prefixes
+        self.loop_count: int = 0
+        self.inline_loop_count: int = 0
+
+    def resolve_loops(self, content: dict) -> dict:
+        """Expands loops and inline loops of every top-level value"""
+        limits = self.budget.limits if self.budget is not None else None
+        return self.__resolve_stage(_resolve_loops, content, self.stats is not None, limits)
+
+    def resolve_references(self, content: dict, params: Dict | None) -> dict:
+        """Resolves the references of every top-level value"""
+        limits = self.budget.limits if self.budget is not None else None
+        return self.__resolve_stage(
+            _resolve_references, content, self.stats is not None, limits, self.deferred_prefixes, params
+        )
+
+    def __resolve_stage(self, stage: Callable, content: dict, *args) -> dict:
+        snapshot = freeze(content)
+        keys = [k for k, v in snapshot.items() if isinstance(v, (dict, list)) or (isinstance(v, str) and "{{" in v)]
+        try:
+            results = self.__map(stage, snapshot, keys, args) if keys else {}
+        except (BrokenProcessPool, OSError, NotImplementedError) as e:
+            # E.g. platforms without working multiprocessing
+            logger.warning("Parallel resolution failed (%s), resolving serially", e)
+            results = {key: stage(key, *args, snapshot=snapshot) for key in keys}
+        resolved = dict(snapshot)
+        for key, result in results.items():
+            resolved[key] = result.content
+            self.loop_count += result.loop_count
+            self.inline_loop_count += result.inline_loop_count
+            if self.stats is not None:
+                self.stats.merge(result.stats)
+            if self.budget is not None:
+                self.budget.add_nodes(result.nodes, key)
+        return resolved
+
+    def __map(self, stage: Callable, snapshot: dict, keys: list, args: tuple) -> Dict[Any, SubtreeResult]:
+        """Runs stage for every key in a pool, which holds the snapshot"""
+        if is_free_threaded():
+            # Threads share the frozen snapshot directly
+            executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="xyml-parallel")
+            kwargs = {"snapshot": snapshot}
+        else:
+            executor = ProcessPoolExecutor(self.max_workers, initializer=_init_worker, initargs=(snapshot,))
+            kwargs = {}
+        with executor:
+            futures = [executor.submit(stage, key, *args, **kwargs) for key in keys]
+            try:
+                return {key: future.result() for key, future in zip(keys, futures)}
+            finally:
+                for future in futures:
+                    future.cancel()
+
+
+def is_free_threaded() -> bool:
+    """Returns True, if python runs without the global interpreter lock"""
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+def can_resolve_parallel(content: Any) -> bool:
+    """
+    Returns True, if the top-level values of content can be resolved independently.
+    Lists iterated by loops must not contain loops themselves, as a serial resolution would iterate their expansion.
+    """
+    if not isinstance(content, dict) or LOOP_KEY in content or len(content) < 2:
+        return False
+    for name in iterated_lists(content):
+        value = content.get(name)
+        if not isinstance(value, list) or has_loops(value):
+            return False
+    return True
+
+
+def iterated_lists(value: Any) -> Iterator[str]:
+    """Yields the names of the lists iterated by all loops and inline loops within value"""
+    if isinstance(value, dict):
+        if LOOP_KEY in value:
+            for loop in str(value[LOOP_KEY]).split(","):
+                match = re.search(LOOP_REGEX, loop)
+                if match:
+                    yield match[2].strip()
+        for v in value.values():
+            yield from iterated_lists(v)
+    elif isinstance(value, list):
+        for x in value:
+            yield from iterated_lists(x)
+    elif isinstance(value, str) and "{{" in value:
+        for match in re.findall(INLINE_LOOP_REGEX, value):
+            yield match[2]
+
+
+def has_loops(value: Any) -> bool:
+    return next(iterated_lists(value), None) is not None
+
+
+def _init_worker(snapshot: dict):
+    global _SNAPSHOT
+    _SNAPSHOT = snapshot
+
+
+def _start(limits: ResolveLimits | None, collect_stats: bool) -> Tuple[ResolveBudget | None, ResolveStats | None]:
+    return limits.start() if limits is not None else None, ResolveStats() if collect_stats else None
+
+
+def _resolve_loops(key: Any, collect_stats: bool, limits: ResolveLimits | None, snapshot: dict | None = None):
+    snapshot = _SNAPSHOT if snapshot is None else snapshot
+    budget, stats = _start(limits, collect_stats)
+    loop_resolver = LoopResolver(False, stats)
+    loop_resolver.budget = budget
+    content = loop_resolver.resolve(snapshot[key], snapshot)
+    inline_loop_resolver = InlineLoopResolver(False, stats)
+    inline_loop_resolver.budget = budget
+    content = inline_loop_resolver.resolve(content, snapshot)
+    result = SubtreeResult(content, stats, budget)
+    result.loop_count = loop_resolver.loop_count
+    result.inline_loop_count = inline_loop_resolver.loop_count
+    return result
+
+
+def _resolve_references(
+    key: Any,
+    collect_stats: bool,
+    limits: ResolveLimits | None,
+    deferred_prefixes: Tuple[str, ...],
+    params: Dict | None,
+    snapshot: dict | None = None,
+):
+    from yaml_extender.xyml_file import reference_config
+
+    snapshot = _SNAPSHOT if snapshot is None else snapshot
+    budget, stats = _start(limits, collect_stats)
+    ref_resolver = ReferenceResolver(False, stats, None, deferred_prefixes)
+    ref_resolver.budget = budget
+    return SubtreeResult(ref_resolver.resolve(snapshot[key], reference_config(snapshot, params)), stats, budget)
@@ -0,0 +1,153 @@
+"""
+Dry-run planning of a resolution.
+
+The planner resolves includes only and estimates the size of the result from the lengths of the iterated lists,
+without expanding any loop. This reveals accidental cartesian products before running an expensive resolution.
+"""
+
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import Any, List
+
+from yaml_extender.resolver.include_resolver import IncludeResolver
+from yaml_extender.resolver.inline_loop_resolver import INLINE_LOOP_REGEX
+from yaml_extender.resolver.loop_resolver import LOOP_CONTENT_KEY, LOOP_KEY, LOOP_REGEX
+from yaml_extender.resolver.reference_resolver import ReferenceResolver
+import yaml_extender.yaml_loader as yaml_loader
+
+
+class LoopEstimate:
+    """Estimated expansion of a single loop statement"""
+
+    def __init__(self, path: str, statement: str, factor: int | None, nodes: int):
+        """
+        Parameters
+            path: Location of the loop within the document
+            statement: Loop statement
+            factor: Number of items created per expansion, None if an iterated list is unknown
+            nodes: Estimated nodes created in total, including enclosing loops
+        """
+        self.path: str = path
+        self.statement: str = statement
+        self.factor: int | None = factor
+        self.nodes: int = nodes
+
+    def as_dict(self) -> dict:
+        return {"path": self.path, "statement": self.statement, "factor": self.factor, "nodes": self.nodes}
+
+
+class ExpansionPlan:
+    """Estimated size of a resolved document"""
+
+    def __init__(self):
+        self.nodes: int = 0
+        self.includes: int = 0
+        self.references: int = 0
+        self.loops: List[LoopEstimate] = []
+        self.inline_loops: int = 0
+
+    def hotspots(self, count: int = 10) -> List[LoopEstimate]:
+        """Returns the loops creating the most nodes"""
+        return sorted(self.loops, key=lambda x: x.nodes, reverse=True)[:count]
+
+    def as_dict(self, hotspots: int = 10) -> dict:
+        return {
+            "nodes": self.nodes,
+            "includes": self.includes,
+            "references": self.references,
+            "loops": len(self.loops),
+            "inline_loops": self.inline_loops,
+            "hotspots": [x.as_dict() for x in self.hotspots(hotspots)],
+        }
+
+    def format(self, hotspots: int = 10) -> str:
+        lines = [
+            f"Estimated nodes:      {self.nodes:,}",
+            f"Included files:       {self.includes:,}",
+            f"Reference lookups:    {self.references:,}",
+            f"Loops:                {len(self.loops):,}",
+            f"Inline loops:         {self.inline_loops:,}",
+        ]
+        if self.loops:
+            lines.append("Hotspots:")
+        for loop in self.hotspots(hotspots):
+            factor = "?" if loop.factor is None else f"x{loop.factor:,}"
+            lines.append(f"  {loop.nodes:>14,} nodes {factor:>10}  {loop.path}: {LOOP_KEY}: {loop.statement}")
+        return "\n".join(lines)
+
+
+def plan_file(filepath: Path, include_dirs: List[Path] | None = None) -> ExpansionPlan:
+    """Reads filepath, resolves its includes and estimates the expansion of the result"""
+    content = yaml_loader.load(str(filepath))
+    dirs = list(include_dirs or []) + [filepath.parent]
+    return plan(content, dirs, filepath)
+
+
+def plan(content: Any, include_dirs: List[Path] | None = None, filepath: Path | None = None) -> ExpansionPlan:
+    """
+    Resolves the includes of content and estimates the expansion of the result
+
+        Parameters:
+            content: Loaded document
+            include_dirs: Directories to search for included files
+            filepath: Path of the document, used to detect include cycles
+    """
+    inc_resolver = IncludeResolver(include_dirs, False)
+    if filepath is not None:
+        # Included files are compared by their resolved path, like in XYmlFile
+        inc_resolver.include_stack = [((str(filepath.resolve()), ()), filepath.name)]
+    content = inc_resolver.resolve(content)
+    expansion_plan = ExpansionPlan()
+    expansion_plan.includes = inc_resolver.include_count
+    expansion_plan.nodes = _Estimator(content, expansion_plan).estimate(content, "", 1)
+    return expansion_plan
+
+
+class _Estimator:
+    def __init__(self, config: Any, expansion_plan: ExpansionPlan):
+        self.config = config
+        self.plan = expansion_plan
+
+    def estimate(self, value: Any, path: str, multiplier: int) -> int:
+        """Returns the estimated number of nodes of value once, multiplier is the number of its copies"""
+        if isinstance(value, dict):
+            if LOOP_KEY in value:
+                return self.__estimate_loop(value, path, multiplier)
+            return 1 + sum(self.estimate(v, f"{path}.{k}" if path else str(k), multiplier) for k, v in value.items())
+        if isinstance(value, list):
+            return 1 + sum(self.estimate(x, f"{path}[{i}]", multiplier) for i, x in enumerate(value))
+        if isinstance(value, str) and "{{" in value:
+            inline_loops = len(re.findall(INLINE_LOOP_REGEX, value))
+            self.plan.inline_loops += inline_loops * multiplier
+            self.plan.references += (len(ReferenceResolver.parse_references(value)) - inline_loops) * multiplier
+        return 1
+
+    def __estimate_loop(self, value: dict, path: str, multiplier: int) -> int:
+        statement = value[LOOP_KEY]
+        factor = self.__loop_factor(statement)
+        other_content = {k: v for k, v in value.items() if k not in (LOOP_KEY, LOOP_CONTENT_KEY)}
+        if LOOP_CONTENT_KEY in value:
+            body = value[LOOP_CONTENT_KEY]
+            other_nodes = self.estimate(other_content, path, multiplier) if other_content else 0
+        else:
+            body = other_content
+            other_nodes = 0
+        item_multiplier = multiplier * (factor if factor is not None else 1)
+        body_nodes = self.estimate(body, path, item_multiplier)
+        nodes = body_nodes * (factor if factor is not None else 1)
+        self.plan.loops.append(LoopEstimate(path, str(statement), factor, nodes * multiplier))
+        # The loop is replaced by a list of its items
+        return 1 + other_nodes + nodes
+
+    def __loop_factor(self, statement: Any) -> int | None:
+        """Returns the number of items of a loop statement, None if an iterated list is not known yet"""
+        factor = 1
+        for loop in str(statement).split(","):
+            match = re.search(LOOP_REGEX, loop)
+            values = self.config.get(match[2].strip()) if match and isinstance(self.config, dict) else None
+            if not isinstance(values, list):
+                return None
+            factor *= len(values)
+        return factor
@@ -0,0 +1,209 @@
+"""
+Arithmetic expressions within references, e.g. ``{{idx * 10 + 8000}}``.
+
+Expressions support +, -, *, /, // and % with the usual precedence, parentheses, unary signs, numbers and
+references on both sides of an operator. A hyphen directly followed by a letter is part of a reference name,
+so "my-key" stays a reference while "a - b" and "a-1" are subtractions.
+Each expression is compiled once into nested closures, constant parts are evaluated on compilation.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import functools
+import math
+import operator
+import re
+from typing import Any, Callable, Dict, List, Tuple
+
+from yaml_extender import yaml_loader
+from yaml_extender.xyml_exception import ExtYamlSyntaxError
+
+OPERATORS = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+    "//": operator.floordiv,
+    "%": operator.mod,
+}
+ADDITIVE_OPERATORS = ("+", "-")
+MULTIPLICATIVE_OPERATORS = ("*", "/", "//", "%")
+TOKEN_REGEX = re.compile(
+    r"\s*(?:(?P<number>\d+(?:\.\d+)?)|(?P<name>[A-Za-z_]\w*(?:\.\w+|-[A-Za-z_]\w*)*)|(?P<operator>//|[-+*/%()]))"
+)
+# Maximum number of compiled expressions kept in memory
+EXPRESSION_CACHE_SIZE = 4096
+
+# Evaluates a compiled node, given a function returning the numeric value of a reference
+Evaluator = Callable[[Callable[[str], Any]], Any]
+
+
+class Expression:
+    """Compiled arithmetic expression"""
+
+    def __init__(
+        self,
+        text: str,
+        tokens: List[Tuple[str, str]],
+        evaluator: Evaluator,
+        references: List[str],
+        constant: Any = None,
+    ):
+        """
+        Parameters
+            text: Source of the expression
+            tokens: Tokens of the expression
+            evaluator: Compiled expression
+            references: Names of all references within the expression, in order of occurrence
+            constant: Value of the expression, if it contains no references
+        """
+        self.text: str = text
+        self.tokens: List[Tuple[str, str]] = tokens
+        self.references: List[str] = references
+        self.constant: Any = constant
+        self.__evaluator: Evaluator = evaluator
+
+    def __repr__(self):
+        return f"Expression({self.text!r})"
+
+    def evaluate(self, lookup: Callable[[str], Any]) -> Any:
+        """
+        Returns the value of the expression.
+
+            Parameters:
+                lookup: Returns the value of a reference, lookup errors are passed on
+        """
+        try:
+            return self.__evaluator(lookup)
+        except (TypeError, ValueError, ArithmeticError) as e:
+            raise ExtYamlSyntaxError(f"Unable to evaluate '{self.text}': {e}")
+
+    def substitute(self, values: Dict[str, Any]) -> str:
+        """Returns the text of the expression with the given references replaced by their numeric values"""
+        parts = []
+        for kind, token in self.tokens:
+            if kind == "name" and token in values:
+                number = to_number(values[token])
+                # The tokenizer has no exponent notation
+                token = repr(number) if "e" not in repr(number) else format(number, "f")
+                token = token if number >= 0 else f"({token})"
+            parts.append(token)
+        return " ".join(parts)
+
+
+def to_number(value: Any) -> int | float:
+    """Returns the numeric value of a resolved reference"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+        return value
+    if isinstance(value, str):
+        return yaml_loader.parse_numeric_value(value.strip())
+    raise TypeError(f"{value!r} is not a numeric value.")
+
+
+@functools.lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def compile_expression(text: str) -> Expression | None:
+    """Returns the compiled expression of a reference or None, if the reference is no arithmetic expression"""
+    tokens = tokenize(text)
+    if tokens is None or not any(kind == "operator" for kind, _ in tokens):
+        return None
+    parser = _Parser(text, tokens)
+    try:
+        evaluator, constant = parser.parse()
+    except ExtYamlSyntaxError:
+        # Like every other reference, which cannot be resolved
+        return None
+    return Expression(text, tokens, evaluator, parser.references, constant)
+
+
+def tokenize(text: str) -> List[Tuple[str, str]] | None:
+    """Returns the tokens of text, None if text is no valid expression"""
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN_REGEX.match(text, position)
+        if match is None:
+            return None
+        tokens.append((match.lastgroup, match[match.lastgroup]))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive descent parser, which compiles tokens into closures"""
+
+    def __init__(self, text: str, tokens: List[Tuple[str, str]]):
+        self.text = text
+        self.tokens = tokens
+        self.position = 0
+        self.references: List[str] = []
+
+    def parse(self) -> Tuple[Evaluator, Any]:
+        node = self.__sum()
+        if self.position < len(self.tokens):
+            self.__fail(f"unexpected '{self.tokens[self.position][1]}'")
+        return node
+
+    def __peek(self) -> str | None:
+        return self.tokens[self.position][1] if self.position < len(self.tokens) else None
+
+    def __fail(self, reason: str):
+        raise ExtYamlSyntaxError(f"Invalid expression '{self.text}': {reason}")
+
+    def __sum(self) -> Tuple[Evaluator, Any]:
+        node = self.__product()
+        while self.__peek() in ADDITIVE_OPERATORS:
+            self.position += 1
+            node = self.__binary(OPERATORS[self.tokens[self.position - 1][1]], node, self.__product())
+        return node
+
+    def __product(self) -> Tuple[Evaluator, Any]:
+        node = self.__unary()
+        while self.__peek() in MULTIPLICATIVE_OPERATORS:
+            self.position += 1
+            node = self.__binary(OPERATORS[self.tokens[self.position - 1][1]], node, self.__unary())
+        return node
+
+    def __unary(self) -> Tuple[Evaluator, Any]:
+        if self.__peek() in ADDITIVE_OPERATORS:
+            self.position += 1
+            sign = -1 if self.tokens[self.position - 1][1] == "-" else 1
+            return self.__binary(operator.mul, self.__constant(sign), self.__unary())
+        return self.__operand()
+
+    def __operand(self) -> Tuple[Evaluator, Any]:
+        if self.position >= len(self.tokens):
+            self.__fail("missing operand")
+        kind, value = self.tokens[self.position]
+        self.position += 1
+        if kind == "number":
+            return self.__constant(yaml_loader.parse_numeric_value(value))
+        if kind == "name":
+            self.references.append(value)
+            return (lambda lookup: to_number(lookup(value))), None
+        if value == "(":
+            node = self.__sum()
+            if self.__peek() != ")":
+                self.__fail("missing ')'")
+            self.position += 1
+            return node
+        self.__fail(f"unexpected '{value}'")
+
+    @staticmethod
+    def __constant(value: Any) -> Tuple[Evaluator, Any]:
+        return (lambda lookup: value), value
+
+    def __binary(
+        self, function: Callable, left: Tuple[Evaluator, Any], right: Tuple[Evaluator, Any]
+    ) -> Tuple[Evaluator, Any]:
+        (left_evaluator, left_value), (right_evaluator, right_value) = left, right
+        if left_value is not None and right_value is not None:
+            # Constant parts are only evaluated once, errors like a division by zero are raised on evaluation
+            with contextlib.suppress(ArithmeticError):
+                return self.__constant(function(left_value, right_value))
+        if left_value is not None:
+            return (lambda lookup: function(left_value, right_evaluator(lookup))), None
+        if right_value is not None:
+            return (lambda lookup: function(left_evaluator(lookup), right_value)), None
+        return (lambda lookup: function(left_evaluator(lookup), right_evaluator(lookup))), None
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from yaml_extender.frozen import freeze
+from yaml_extender.resolver.include_resolver import INCLUDE_KEY, INCLUDE_REGEX, find_include_file
+from yaml_extender.tracing import Tracer
+import yaml_extender.yaml_loader as yaml_loader
+
+DEFAULT_PREFETCH_WORKERS = 8
+
+
+class IncludePrefetcher:
+    """
+    Reads and parses included files concurrently in a bounded thread pool.
+
+    Documents are scanned for literal include statements, which are loaded ahead of the IncludeResolver.
+    Every prefetched file is scanned for further includes as soon as it is parsed.
+    Include statements containing references can only be evaluated during resolution and are read lazily.
+    Parsed files are cached, so a prefetcher can be shared by multiple resolutions, also from different threads.
+    """
+
+    def __init__(
+        self, max_workers: int = DEFAULT_PREFETCH_WORKERS, tracer: Tracer | None = None, validate: bool = False
+    ):
+        """
+        Parameters
+            max_workers: Number of threads reading files
+            tracer: Records the reading and parsing of files if set
+            validate: Re-read cached files, when their modification time or size changed
+        """
+        self.tracer: Tracer | None = tracer
+        self.validate: bool = validate
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="xyml-prefetch")
+        self._futures: Dict[str, Future] = {}
+        self._versions: Dict[str, Tuple[int, int] | None] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            futures = list(self._futures.values())
+        for future in futures:
+            future.cancel()
+        self._executor.shutdown(wait=True)
+
+    def scan(self, content: Any, include_dirs: List[Path]):
+        """Schedules reading all literal include statements within content"""
+        if isinstance(content, dict):
+            for k, v in content.items():
+                if k == INCLUDE_KEY:
+                    self.__prefetch_statements(v, include_dirs)
+                else:
+                    self.scan(v, include_dirs)
+        elif isinstance(content, list):
+            for x in content:
+                self.scan(x, include_dirs)
+
+    def load(self, file: Path, include_dirs: List[Path]) -> Any:
+        """
+        Returns the content of file. Waits for the prefetched content if available, otherwise the file is read.
+
+            Parameters:
+                file: Path of the included file
+                include_dirs: Include directories, which are used to resolve the includes of file
+        """
+        # Cache keys must not depend on the working directory, which may differ between resolutions
+        file = file.absolute()
+        version = self.__version(file)
+        with self._lock:
+            future = self.__cached(str(file), version)
+            lazy_read = future is None and not self._closed
+            if lazy_read:
+                future = Future()
+                self._futures[str(file)] = future
+                self._versions[str(file)] = version
+        if future is None or future.cancelled():
+            return freeze(yaml_loader.load(str(file), tracer=self.tracer))
+        if lazy_read:
+            try:
+                content = freeze(yaml_loader.load(str(file), tracer=self.tracer))
+            except BaseException as e:
+                future.set_exception(e)
+                with self._lock:
+                    if self._futures.get(str(file)) is future:
+                        del self._futures[str(file)]
+                raise
+            future.set_result(content)
+            self.scan(content, [d.absolute() for d in include_dirs])
+        # Cached content is frozen and shared by all include sites
+        return future.result()
+
+    def __prefetch_statements(self, value: List | str, include_dirs: List[Path]):
+        statements = value if isinstance(value, list) else [value]
+        for statement in statements:
+            if not isinstance(statement, str):
+                continue
+            match = re.match(INCLUDE_REGEX, statement)
+            if not match or "{{" in match.group(1):
+                # Paths with references depend on the resolved document
+                continue
+            file_path = match.group(1)
+            file = find_include_file(file_path, include_dirs)
+            if file is None:
+                continue
+            file = file.absolute()
+            nested_include_dirs = [d.absolute() for d in include_dirs] + [Path(file_path).parent.absolute()]
+            version = self.__version(file)
+            with self._lock:
+                if self._closed or self.__cached(str(file), version) is not None:
+                    continue
+                self._futures[str(file)] = self._executor.submit(self.__read, file, nested_include_dirs)
+                self._versions[str(file)] = version
+
+    def __version(self, file: Path) -> Tuple[int, int] | None:
+        """Returns modification time and size of file, if cached files are validated"""
+        if not self.validate:
+            return None
+        try:
+            stat = file.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def __cached(self, key: str, version: Tuple[int, int] | None) -> Future | None:
+        """Returns the cached future of key, if it is still valid. Must be called with the lock held."""
+        future = self._futures.get(key)
+        if future is not None and self.validate and self._versions.get(key) != version:
+            del self._futures[key]
+            return None
+        return future
+
+    def __read(self, file: Path, include_dirs: List[Path]) -> Any:
+        content = freeze(yaml_loader.load(str(file), tracer=self.tracer))
+        self.scan(content, include_dirs)
+        return content
@@ -2,28 +2,68 @@ from __future__ import annotations
 
 import re
 from pathlib import Path
-from typing import Any, List
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
 
+from yaml_extender.frozen import freeze, reuse, thaw
 from yaml_extender.resolver.reference_resolver import ReferenceResolver
 from yaml_extender.resolver.resolver import Resolver
-from yaml_extender.xyml_exception import ExtYamlError, ExtYamlSyntaxError
+from yaml_extender.stats import ResolveStats
+from yaml_extender.tracing import Tracer
+from yaml_extender.xyml_exception import ExtYamlError, ExtYamlSyntaxError, IncludeCycleError
 import yaml_extender.logger as logger
 import yaml_extender.yaml_loader as yaml_loader
 
+if TYPE_CHECKING:
+    from yaml_extender.resolver.include_prefetcher import IncludePrefetcher
 
 INCLUDE_REGEX = r"([^<]+)\s*(?:<<(.*)>>)?"
 INCLUDE_KEY = "xyml.include"
 
+# Resolved path, parameters and include directories of an include
+IncludeKey = Tuple[str, Tuple[Tuple[str, str], ...], Tuple[Path, ...]]
+
+
+def find_include_file(file_path: str, include_dirs: List[Path]) -> Path | None:
+    """Returns the path of an included file, trying all include dirs respecting the order"""
+    file = Path(file_path)
+    if file.is_absolute():
+        return file
+    for path in include_dirs:
+        file = path / file_path
+        if file.is_file():
+            return file
+    return None
+
 
 class IncludeResolver(Resolver):
-    def __init__(self, include_dirs: List[Path] | None = None, fail_on_resolve: bool = True):
+    def __init__(
+        self,
+        include_dirs: List[Path] | None = None,
+        fail_on_resolve: bool = True,
+        stats: ResolveStats | None = None,
+        tracer: Tracer | None = None,
+        prefetcher: IncludePrefetcher | None = None,
+    ):
         if include_dirs:
             self.include_dirs: List[Path] = [inc.absolute() for inc in include_dirs]
         else:
             self.include_dirs: List[Path] = []
         if Path.cwd() not in self.include_dirs:
             self.include_dirs.append(Path.cwd())
-        super().__init__(fail_on_resolve)
+        # Nesting level of this resolver within included files
+        self.depth: int = 0
+        # Number of includes resolved by this resolver and its nested resolvers
+        self.include_count: int = 0
+        self.prefetcher: IncludePrefetcher | None = prefetcher
+        # Resolved includes and their include count, shared with nested resolvers
+        self.include_cache: Dict[IncludeKey, Tuple[Any, int]] = {}
+        # Frozen content of read files, shared with nested resolvers
+        self.file_cache: Dict[str, Any] = {}
+        # Set, if an include path depends on the document, so results cannot be reused
+        self.config_dependent: bool = False
+        # Files and parameters of the includes currently being resolved, used to detect include cycles
+        self.include_stack: List[Tuple[Tuple[str, Tuple], str]] = []
+        super().__init__(fail_on_resolve, stats, tracer)
 
     def _Resolver__resolve(self, cur_value: Any, config: dict) -> dict:
         return self.__resolve_inc(cur_value, config)
@@ -35,13 +75,23 @@ class IncludeResolver(Resolver):
             Returns:
                 The content of the original file with all includes resolved.
         """
+        if self.stats is not None:
+            self.stats.nodes_visited += 1
         if isinstance(cur_value, dict):
             for k, v in list(cur_value.items()):
                 if k != INCLUDE_KEY:
-                    cur_value[k] = self.__resolve_inc(cur_value[k], config)
+                    new_value = self.__resolve_inc(cur_value[k], config)
+                    if new_value is not cur_value[k]:
+                        # Frozen content of included files is only copied along modified paths
+                        cur_value = thaw(cur_value)
+                        cur_value[k] = new_value
                 else:
                     include_content = self.__resolve_include_statement(cur_value[INCLUDE_KEY], config)
-                    if isinstance(include_content, dict):
+                    if isinstance(include_content, dict) and len(cur_value) == 1:
+                        # Nothing to merge, the included content is used as it is
+                        return include_content
+                    elif isinstance(include_content, dict):
+                        cur_value = thaw(cur_value)
                         self.update_content_with_include_content(cur_value, include_content)
                         del cur_value[INCLUDE_KEY]
                     else:
@@ -55,7 +105,7 @@ class IncludeResolver(Resolver):
                 else:
                     new_content.append(new_value)
             if new_content:
-                cur_value = new_content
+                cur_value = reuse(cur_value, new_content)
         return cur_value
 
     def __resolve_include_statement(self, value: List | str, config: dict) -> dict:
@@ -65,31 +115,74 @@ class IncludeResolver(Resolver):
         else:
             statements = value
         # Resolve all references in statement
-        ref_resolver = ReferenceResolver(False)
+        ref_resolver = ReferenceResolver(False, self.stats, self.tracer, partial_expressions=True)
         inc_contents = None
         for statement in statements:
-            # Resolve include parameters
-            match = re.match(INCLUDE_REGEX, statement)
-            # Resolve references in filenames
-            inc_file_path = ref_resolver.resolve(match.group(1), config)
-            logger.info(f"Resolving Include '{inc_file_path}'")
-            inc_content = self.__read_included_yaml(inc_file_path)
-            # Resolve parameters in included file
-            if match.group(2):
-                parameters = self.__parse_include_parameters(match.group(2))
-                inc_content = ref_resolver.resolve(inc_content, parameters)
-            # Add include content to current content
-            include_dirs = self.include_dirs.copy()
-            include_dirs.append(Path(inc_file_path).parent)
-            inc_resolver = IncludeResolver(include_dirs, self.fail_on_resolve)
-            inc_content = inc_resolver.__resolve_inc(inc_content, config)
+            with self._span("include", statement=statement):
+                inc_content = self.__resolve_single_include(statement, ref_resolver, config)
             inc_contents = self.update_inc_content(inc_contents, inc_content)
         return inc_contents
 
+    def __resolve_single_include(self, statement: str, ref_resolver: ReferenceResolver, config: dict) -> Any:
+        """Reads a single included file and resolves its parameters and nested includes"""
+        # Resolve include parameters
+        match = re.match(INCLUDE_REGEX, statement)
+        if "{{" in match.group(1):
+            self.config_dependent = True
+        # Resolve references in filenames
+        inc_file_path = ref_resolver.resolve(match.group(1), config)
+        logger.debug("Resolving include '%s'", inc_file_path)
+        include_dirs = self.include_dirs.copy()
+        include_dirs.append(Path(inc_file_path).parent)
+        file = self.__find_included_yaml(inc_file_path)
+        parameters = self.__parse_include_parameters(match.group(2)) if match.group(2) else {}
+        key = (str(file), tuple(sorted((k, repr(v)) for k, v in parameters.items())), tuple(include_dirs))
+        # The same file may be reached through different paths, e.g. "a/../b.yaml" and "b.yaml"
+        stack_key = (str(file.resolve()), key[1])
+        stack_keys = [x[0] for x in self.include_stack]
+        if stack_key in stack_keys:
+            raise IncludeCycleError([x[1] for x in self.include_stack[stack_keys.index(stack_key) :]] + [statement])
+        if self.budget is not None:
+            self.budget.check_include_depth(self.depth + 1, statement)
+            self.budget.check_time(statement)
+        cached = self.include_cache.get(key)
+        if cached is not None:
+            logger.debug("Reusing resolved include '%s'", inc_file_path)
+            self.include_count += cached[1]
+            return cached[0]
+        inc_content = self.__read_included_yaml(file, include_dirs)
+        self.include_count += 1
+        if self.stats is not None:
+            self.stats.includes_read += 1
+        # Resolve parameters in included file
+        if parameters:
+            with self._span("parameters", parameters=match.group(2)):
+                inc_content = ref_resolver.resolve(inc_content, parameters)
+        # Add include content to current content
+        inc_resolver = IncludeResolver(include_dirs, self.fail_on_resolve, self.stats, self.tracer, self.prefetcher)
+        inc_resolver.depth = self.depth + 1
+        inc_resolver.include_cache = self.include_cache
+        inc_resolver.file_cache = self.file_cache
+        inc_resolver.include_stack = self.include_stack + [(stack_key, statement)]
+        inc_resolver.budget = self.budget
+        if self.stats is not None:
+            self.stats.update_include_depth(inc_resolver.depth)
+        with self._span("nested include", path=inc_file_path):
+            inc_content = inc_resolver.__resolve_inc(inc_content, config)
+        self.include_count += inc_resolver.include_count
+        if inc_resolver.config_dependent:
+            self.config_dependent = True
+        else:
+            # Frozen content is shared by all include sites
+            inc_content = freeze(inc_content)
+            self.include_cache[key] = (inc_content, inc_resolver.include_count + 1)
+        return inc_content
+
     def update_content_with_include_content(self, existing_content, include_content):
         for k, v in include_content.items():
             if k in existing_content:
                 if isinstance(v, dict):
+                    existing_content[k] = thaw(existing_content[k])
                     self.update_content_with_include_content(existing_content[k], v)
             else:
                 existing_content[k] = v
@@ -98,6 +191,7 @@ class IncludeResolver(Resolver):
         """Adds include content to existing content based on current datatype"""
         if content is None:
             return include
+        content = thaw(content)
         if isinstance(include, list):
             if isinstance(content, dict):
                 content = [content]
@@ -121,14 +215,15 @@ class IncludeResolver(Resolver):
             parameters[key] = yaml_loader.parse_any_value(value)
         return parameters
 
-    def __read_included_yaml(self, file_path: str):
-        # Try path with all include dirs respecting the order
-        file = Path(file_path)
-        if not file.is_absolute():
-            for path in self.include_dirs:
-                file = path / file_path
-                if file.is_file():
-                    return yaml_loader.load(str(file))
-        else:
-            return yaml_loader.load(str(file))
-        raise ExtYamlError(f"Include file '{file_path}' not found. Are include directories provided?")
+    def __find_included_yaml(self, file_path: str) -> Path:
+        file = find_include_file(file_path, self.include_dirs)
+        if file is None:
+            raise ExtYamlError(f"Include file '{file_path}' not found. Are include directories provided?")
+        return file
+
+    def __read_included_yaml(self, file: Path, include_dirs: List[Path]):
+        if self.prefetcher is not None:
+            return self.prefetcher.load(file, include_dirs)
+        if str(file) not in self.file_cache:
+            self.file_cache[str(file)] = freeze(yaml_loader.load(str(file), tracer=self.tracer))
+        return self.file_cache[str(file)]
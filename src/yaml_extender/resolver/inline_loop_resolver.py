@@ -3,8 +3,11 @@ from __future__ import annotations
 import re
 from typing import Any
 
+from yaml_extender.frozen import reuse, thaw
 from yaml_extender.resolver.reference_resolver import ReferenceResolver
 from yaml_extender.resolver.resolver import Resolver
+from yaml_extender.stats import ResolveStats
+from yaml_extender.tracing import Tracer
 from yaml_extender.xyml_exception import ExtYamlSyntaxError
 
 LOOP_KEY = "xyml.for"
@@ -13,16 +16,28 @@ MAXIMUM_REFERENCE_DEPTH = 30
 
 
 class InlineLoopResolver(Resolver):
-    def __init__(self, fail_on_resolve: bool = True):
-        super().__init__(fail_on_resolve)
-        self.ref_resolver = ReferenceResolver(False)
+    def __init__(
+        self,
+        fail_on_resolve: bool = True,
+        stats: ResolveStats | None = None,
+        tracer: Tracer | None = None,
+    ):
+        super().__init__(fail_on_resolve, stats, tracer)
+        self.ref_resolver = ReferenceResolver(False, stats, tracer, partial_expressions=True)
+        self.loop_count: int = 0
 
     def _Resolver__resolve(self, cur_value: Any, config: dict):
         """Resolves all references in a given value using the provided content dict"""
+        if self.stats is not None:
+            self.stats.nodes_visited += 1
         new_value = cur_value
         if isinstance(cur_value, dict):
-            for k in cur_value.keys():
-                cur_value[k] = self._Resolver__resolve(cur_value[k], config)
+            for k, v in cur_value.items():
+                resolved_value = self._Resolver__resolve(v, config)
+                if resolved_value is not v:
+                    # Frozen nodes are only copied, if one of their values changes
+                    new_value = thaw(new_value)
+                    new_value[k] = resolved_value
         elif isinstance(cur_value, list):
             new_list = []
             for i, x in enumerate(cur_value):
@@ -31,8 +46,8 @@ class InlineLoopResolver(Resolver):
                     # If the returned value is also a list, extend the current list with it
                     new_list.extend(resolved_value)
                 else:
-                    new_list.append(self._Resolver__resolve(x, config))
-            new_value = new_list
+                    new_list.append(resolved_value)
+            new_value = reuse(cur_value, new_list)
         elif isinstance(cur_value, str):
             new_value = self.resolve_inline_loop(cur_value, config)
         return new_value
@@ -47,7 +62,13 @@ class InlineLoopResolver(Resolver):
             iter_content = config[iteration_value]
             if not isinstance(iter_content, list):
                 raise ExtYamlSyntaxError(f"{iteration_value} is not iterable and therefore cannot be used in a loop.")
-            new_content = self.get_loop_content(content, iterator, iter_content)
+            if self.budget is not None:
+                self.budget.add_nodes(len(iter_content), full_match)
+            with self._span("inline loop", statement=full_match):
+                new_content = self.get_loop_content(content, iterator, iter_content)
+            self.loop_count += 1
+            if self.stats is not None:
+                self.stats.loops_expanded += 1
             new_value = new_value.replace(full_match, new_content)
         return new_value
 
@@ -2,10 +2,16 @@ from __future__ import annotations
 
 import copy
 import re
-from typing import Any
+from collections import ChainMap
+from typing import Any, Iterator, List, Set, Tuple
 
-from yaml_extender.resolver.reference_resolver import ReferenceResolver
+from yaml_extender.frozen import reuse, thaw
+from yaml_extender.limits import count_nodes
+from yaml_extender.resolver.expression import Expression, compile_expression, to_number
+from yaml_extender.resolver.reference_resolver import ReferenceResolver, has_key_path
 from yaml_extender.resolver.resolver import Resolver
+from yaml_extender.stats import ResolveStats
+from yaml_extender.tracing import Tracer
 from yaml_extender.xyml_exception import ExtYamlSyntaxError
 
 LOOP_KEY = "xyml.for"
@@ -15,19 +21,44 @@ MAXIMUM_REFERENCE_DEPTH = 30
 
 
 class LoopResolver(Resolver):
-    def __init__(self, fail_on_resolve: bool = True):
-        super().__init__(fail_on_resolve)
-        self.ref_resolver = ReferenceResolver(False)
+    def __init__(
+        self,
+        fail_on_resolve: bool = True,
+        stats: ResolveStats | None = None,
+        tracer: Tracer | None = None,
+    ):
+        super().__init__(fail_on_resolve, stats, tracer)
+        self.ref_resolver = ReferenceResolver(False, stats, tracer, partial_expressions=True)
+        self.loop_count: int = 0
+        self.hoisted_count: int = 0
+        # Iterators of the loops enclosing the currently resolved value
+        self.iterators: List[str] = []
 
     def _Resolver__resolve(self, cur_value: Any, config: dict):
         """Resolves all references in a given value using the provided content dict"""
+        if self.stats is not None:
+            self.stats.nodes_visited += 1
         new_value = cur_value
         if isinstance(cur_value, dict):
-            for k, v in cur_value.items():
-                new_value[k] = self._Resolver__resolve(v, config)
+            iterators = get_iterators(cur_value.get(LOOP_KEY))
+            self.iterators.extend(iterators)
+            try:
+                for k, v in cur_value.items():
+                    resolved_value = self._Resolver__resolve(v, config)
+                    if resolved_value is not v:
+                        # Frozen nodes are only copied, if one of their values changes
+                        new_value = thaw(new_value)
+                        new_value[k] = resolved_value
+            finally:
+                del self.iterators[len(self.iterators) - len(iterators) :]
             if LOOP_KEY in cur_value:
-                new_value = self.resolve_loop(cur_value[LOOP_KEY], copy.deepcopy(new_value), config)
+                with self._span("loop", statement=cur_value[LOOP_KEY]):
+                    # Only the loop statement is consumed, the body is copied per item
+                    new_value = self.resolve_loop(cur_value[LOOP_KEY], dict(new_value), config)
         elif isinstance(cur_value, list):
+            # Loops are expanded in place, frozen lists are kept if nothing changed
+            original = cur_value
+            cur_value = new_value = thaw(cur_value)
             for i, x in enumerate(cur_value):
                 resolved_loop_content = self._Resolver__resolve(x, config)
                 if isinstance(resolved_loop_content, list):
@@ -39,47 +70,204 @@ class LoopResolver(Resolver):
                         new_value.insert(i + j, value)
                 else:
                     new_value[i] = resolved_loop_content
+            new_value = reuse(original, new_value)
         return new_value
 
     def resolve_loop(self, loop_desc, loop_config, config):
+        """Returns all expanded items of a loop, see iter_loop"""
+        return list(self.iter_loop(loop_desc, loop_config, config))
+
+    def iter_loop(self, loop_desc: str, loop_config: dict, config: dict) -> Iterator:
+        """
+        Yields the expanded items of a loop one after another.
+        Multi loops are expanded depth first, so no intermediate list is created per loop level.
+        The LoopResolver collects all items, as references between them are resolved afterwards,
+        so only callers consuming the items one by one avoid holding the whole expansion.
+
+            Parameters:
+                loop_desc: Loop statement, e.g. "a:list_a, b:list_b"
+                loop_config: Dict containing the loop statement, which is consumed
+                config: Config used to look up the iterated lists
+        """
+        self.loop_count += 1
+        if self.stats is not None:
+            self.stats.loops_expanded += 1
         other_content = []
         # Remove loop statement from dict
         del loop_config[LOOP_KEY]
         # Set initial value for resolution
         if LOOP_CONTENT_KEY in loop_config:
-            loop_values = [loop_config[LOOP_CONTENT_KEY]]
+            loop_value = loop_config[LOOP_CONTENT_KEY]
             del loop_config[LOOP_CONTENT_KEY]
             # Keep track of values that might be in the same dict, but have nothing to do with the loop
             if loop_config:
                 other_content = [loop_config]
         else:
-            loop_values = [loop_config]
+            loop_value = loop_config
         # Iterate over possible multiloops
-        loops = loop_desc.split(",")
-        for loop in loops:
+        loops = []
+        for loop in loop_desc.split(","):
             # Retrieve value and iterator
             match = re.search(LOOP_REGEX, loop)
             if not match or len(match.groups()) < 2:
                 raise ExtYamlSyntaxError(f"No valid loop statement: {loop}")
-            iterator = match[1].strip()
             iteration_value = config[match[2].strip()]
             if not isinstance(iteration_value, list):
                 raise ExtYamlSyntaxError(f"No valid loop statement: {loop}")
+            loops.append((match[1].strip(), iteration_value))
+        # References, which do not depend on any iterator, are resolved once instead of once per item
+        loop_value = self.hoist_references(loop_value, config, set(self.iterators + [x[0] for x in loops]))
+        yield from other_content
+        items = self.iter_loop_content(loop_value, loops)
+        if self.budget is not None:
+            items = self.__budgeted(items, count_nodes(loop_value), loop_desc)
+        yield from items
 
-            # Replace the content with filled content
-            loop_values = self.get_loop_content(loop_values, iteration_value, iterator)
-        if other_content:
-            loop_values = other_content + loop_values
-        return loop_values
+    def __budgeted(self, items: Iterator, item_size: int, loop_desc: str) -> Iterator:
+        """Accounts every expanded item to the budget, which aborts the expansion once exceeded"""
+        for item in items:
+            self.budget.add_nodes(item_size, f"{LOOP_KEY}: {loop_desc}")
+            yield item
+
+    def hoist_references(self, value: Any, config: dict, iterators: Set[str]) -> Any:
+        """
+        Replaces loop invariant references within a loop body by their values.
+        Only references to scalar values, which are final at this stage, are replaced.
+        Everything else is left to the ReferenceResolver.
+
+            Parameters:
+                value: Loop body
+                config: Config of the document
+                iterators: Names of all iterators the body may depend on
+        """
+        if isinstance(value, dict):
+            new_value = value
+            for k, v in value.items():
+                hoisted_value = self.hoist_references(v, config, iterators)
+                if hoisted_value is not v:
+                    # The body may be shared, e.g. by a yaml alias, so it is copied before its first change
+                    new_value = dict(new_value) if new_value is value else new_value
+                    new_value[k] = hoisted_value
+            return new_value
+        elif isinstance(value, list):
+            return reuse(value, [self.hoist_references(x, config, iterators) for x in value])
+        elif isinstance(value, str) and "{{" in value:
+            new_value = value
+            for full_ref, ref, default in ReferenceResolver.parse_references(value):
+                expression = compile_expression(ref)
+                if expression is not None and has_key_path(ref, config):
+                    # Keys containing operator characters take precedence over expressions
+                    expression = None
+                if expression is None:
+                    ref_val = get_invariant_value(ref, config, iterators)
+                else:
+                    ref_val = get_invariant_expression(expression, config, iterators)
+                if ref_val is None:
+                    continue
+                self.hoisted_count += 1
+                if self.stats is not None:
+                    self.stats.references_resolved += 1
+                if isinstance(ref_val, str) and expression is not None:
+                    # Partially evaluated, only the references to the iterators are left
+                    default = f":{default}" if default is not None else ""
+                    new_value = new_value.replace(full_ref, "{{" + ref_val + default + "}}")
+                elif full_ref == value:
+                    # Preserve the type, like the ReferenceResolver does
+                    return ref_val
+                new_value = new_value.replace(full_ref, str(ref_val))
+            return new_value
+        return value
+
+    def iter_loop_content(
+        self, loop_config: Any, loops: List[Tuple[str, list]], scope: ChainMap | None = None
+    ) -> Iterator:
+        """
+        Yields loop_config filled with every combination of the iterated values, in the order of loops.
+
+            Parameters:
+                loop_config: Loop body
+                loops: Iterator and iterated values of each remaining loop
+                scope: Values of the iterators of the enclosing loop levels
+        """
+        iterator, iteration_value = loops[0]
+        for item in iteration_value:
+            # Outer iterators take precedence, as they were filled first
+            item_scope = ChainMap(*(scope.maps if scope else []), {iterator: item})
+            if len(loops) > 1 and isinstance(loop_config, dict):
+                # A dict body stays a dict, so it is copied and filled once with all iterators of the innermost loop
+                yield from self.iter_loop_content(loop_config, loops[1:], item_scope)
+                continue
+            target_value = copy.deepcopy(loop_config)
+            target_value = self.ref_resolver.resolve(target_value, item_scope)
+            # A filled list is flattened into the loop
+            targets = target_value if isinstance(target_value, list) else [target_value]
+            if len(loops) == 1:
+                yield from targets
+            else:
+                for target in targets:
+                    yield from self.iter_loop_content(target, loops[1:], item_scope)
 
     def get_loop_content(self, loop_configs: list[dict], iteration_value: list, iterator: str):
         loop_values = []
         for loop_config in loop_configs:
-            for item in iteration_value:
-                target_value = copy.deepcopy(loop_config)
-                target_value = self.ref_resolver.resolve(target_value, {iterator: item})
-                if isinstance(target_value, list):
-                    loop_values.extend(target_value)
-                else:
-                    loop_values.append(target_value)
+            loop_values.extend(self.iter_loop_content(loop_config, [(iterator, iteration_value)]))
         return loop_values
+
+
+def get_iterators(loop_desc: Any) -> List[str]:
+    """Returns the iterator names of a loop statement"""
+    if not isinstance(loop_desc, str):
+        return []
+    matches = (re.search(LOOP_REGEX, loop) for loop in loop_desc.split(","))
+    return [match[1].strip() for match in matches if match]
+
+
+def get_invariant_value(ref: str, config: dict, iterators: Set[str]) -> Any:
+    """
+    Returns the value of a reference, if it is independent of the iterators and cannot change anymore, otherwise None.
+    References into lists, loops, runtime values or values with further references are never final.
+    """
+    if "{" in ref or ref.startswith("xyml."):
+        return None
+    keys = ref.split(".")
+    if keys[0] in iterators:
+        return None
+    value = config
+    for key in keys:
+        if not isinstance(value, dict) or LOOP_KEY in value or key not in value:
+            return None
+        value = value[key]
+    if isinstance(value, str):
+        return None if "{" in value or "}" in value else value
+    if isinstance(value, (int, float)):
+        return value
+    return None
+
+
+def get_invariant_expression(expression: Expression, config: dict, iterators: Set[str]) -> Any:
+    """
+    Returns the value of an expression, if all its references are loop invariant numbers.
+    Returns the expression with the invariant references substituted, if all others are iterators. Otherwise None.
+    """
+    if not expression.references:
+        return expression.constant
+    values = {}
+    for name in expression.references:
+        value = get_invariant_value(name, config, iterators)
+        try:
+            values[name] = to_number(value)
+        except (TypeError, ValueError):
+            pass
+    if not values:
+        return None
+    remaining = [x for x in expression.references if x not in values]
+    if remaining:
+        # Unresolved references, which are no iterators, are kept unchanged for the ReferenceResolver
+        if any(x.split(".")[0] not in iterators for x in remaining):
+            return None
+        return expression.substitute(values)
+    try:
+        return expression.evaluate(values.__getitem__)
+    except ExtYamlSyntaxError:
+        # E.g. a division by zero, which is reported by the ReferenceResolver
+        return None
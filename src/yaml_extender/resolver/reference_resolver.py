@@ -1,11 +1,16 @@
 from __future__ import annotations
 
 import re
-from typing import Any, Optional
+import time
+from typing import Any, List, Mapping, Tuple
 
 from yaml_extender import yaml_loader
+from yaml_extender.frozen import reuse, thaw
+from yaml_extender.resolver.expression import Expression, compile_expression, to_number
 from yaml_extender.resolver.resolver import Resolver
-from yaml_extender.xyml_exception import RecursiveReferenceError, ReferenceNotFoundError
+from yaml_extender.stats import ResolveStats
+from yaml_extender.tracing import Tracer
+from yaml_extender.xyml_exception import ExtYamlSyntaxError, RecursiveReferenceError, ReferenceNotFoundError
 
 REFERENCE_REGEX = r"\{\{(.+?)(?::(.*?))?\}\}"
 ARRAY_REGEX = r"(.*)?\[(\d*)\]"
@@ -14,46 +19,39 @@ LIST_FLATTEN_CHARACTER = " "
 MAXIMUM_REFERENCE_DEPTH = 30
 
 
-class ArithmeticOperation:
-    SUPPORTED_FUNCS = {
-        "+": lambda x, y: x + y,
-        "-": lambda x, y: x - y,
-        "*": lambda x, y: x * y,
-        "/": lambda x, y: x / y,
-    }
-    ARITHMETIC_REGEX = r"(.+)([" + "".join(["\\" + k for k in SUPPORTED_FUNCS.keys()]) + r"])\s*(\d+)"
-
-    def __init__(self, reference: str, operation: str, value: str):
-        self.reference = reference.strip()
-        self.operation = operation.strip()
-        self.value = yaml_loader.parse_numeric_value(value.strip())
-
-    def __repr__(self):
-        return f"{self.reference} {self.operation} {self.value}"
-
-    def apply(self, value):
-        num_val = yaml_loader.parse_numeric_value(value)
-        return ArithmeticOperation.SUPPORTED_FUNCS[self.operation](self.value, num_val)
-
-    @staticmethod
-    def parse(expression: str) -> Optional[ArithmeticOperation]:
-        match = re.search(ArithmeticOperation.ARITHMETIC_REGEX, expression)
-        if match:
-            return ArithmeticOperation(match[1], match[2], match[3])
-        else:
-            return None
-
-
 class ReferenceResolver(Resolver):
-    def __init__(self, fail_on_resolve: bool = True):
-        super().__init__(fail_on_resolve)
+    def __init__(
+        self,
+        fail_on_resolve: bool = True,
+        stats: ResolveStats | None = None,
+        tracer: Tracer | None = None,
+        deferred_prefixes: Tuple[str, ...] = (),
+        partial_expressions: bool = False,
+    ):
+        """
+        Parameters
+            deferred_prefixes: References starting with one of these prefixes are kept unresolved,
+                               in order to resolve them later, e.g. when rendering a compiled artifact.
+            partial_expressions: Substitute the resolvable references of arithmetic expressions, which cannot be
+                                 evaluated completely. Used for loop iterators and include parameters, which are
+                                 unknown afterwards. Otherwise such expressions are kept unchanged.
+        """
+        super().__init__(fail_on_resolve, stats, tracer)
+        self.deferred_prefixes: Tuple[str, ...] = deferred_prefixes
+        self.partial_expressions: bool = partial_expressions
 
     def _Resolver__resolve(self, cur_value: Any, config: dict):
         """Resolves all references in a given value using the provided content dict"""
+        if self.stats is not None:
+            self.stats.nodes_visited += 1
         new_value = cur_value
         if isinstance(cur_value, dict):
-            for k in cur_value.keys():
-                cur_value[k] = self._Resolver__resolve(cur_value[k], config)
+            for k, v in cur_value.items():
+                resolved_value = self._Resolver__resolve(v, config)
+                if resolved_value is not v:
+                    # Frozen nodes are only copied, if one of their values changes
+                    new_value = thaw(new_value)
+                    new_value[k] = resolved_value
         elif isinstance(cur_value, list):
             new_list = []
             for i, x in enumerate(cur_value):
@@ -62,10 +60,21 @@ class ReferenceResolver(Resolver):
                     # If the returned value is also a list, extend the current list with it
                     new_list.extend(resolved_value)
                 else:
-                    new_list.append(self._Resolver__resolve(x, config))
-            new_value = new_list
-        else:
+                    new_list.append(resolved_value)
+            new_value = reuse(cur_value, new_list)
+        elif self.tracer is None:
             new_value = self.resolve_reference(cur_value, config)
+        else:
+            new_value = self.__traced_resolve_reference(cur_value, config)
+        return new_value
+
+    def __traced_resolve_reference(self, value: Any, config: dict) -> Any:
+        """Resolves a reference and records it as span, if its resolution exceeds the tracers threshold"""
+        start = time.perf_counter()
+        new_value = self.resolve_reference(value, config)
+        end = time.perf_counter()
+        if end - start >= self.tracer.slow_reference_threshold:
+            self.tracer.add_span("reference", type(self).__name__, start, end, {"value": value})
         return new_value
 
     @staticmethod
@@ -95,25 +104,51 @@ class ReferenceResolver(Resolver):
             start_idx = value.find("{{", end_idx)
         return findings
 
-    def resolve_reference(self, value: Any, config: dict, depth: int = 0) -> Any:
+    def resolve_reference(self, value: Any, config: dict, depth: int = 0, references: List | None = None) -> Any:
+        """
+        Resolves all references within value.
+
+            Parameters:
+                references: Result of parse_references for value, if already known
+        """
         if not isinstance(value, str) or "{" not in value:
             return value
         if depth > 30:
             raise RecursiveReferenceError(value)
+        if self.budget is not None:
+            self.budget.check_time(value)
+        if self.stats is not None:
+            self.stats.update_reference_depth(depth)
         new_value = value
         # In order to store the full match the whole regex is packed into a group
-        for ref_match in ReferenceResolver.parse_references(value):
+        if references is None:
+            references = ReferenceResolver.parse_references(value)
+        for ref_match in references:
             ref = ref_match[1]
+            if self.deferred_prefixes and ref.startswith(self.deferred_prefixes):
+                continue
             default_value = ref_match[2]
             if default_value is not None:
                 default_value = yaml_loader.parse_any_value(default_value.strip())
-            # Resolve arithmetic operation
-            operation = ArithmeticOperation.parse(ref)
-            if operation:
-                ref = operation.reference
+            # Arithmetic expressions are compiled once and evaluated with the values of their references
+            expression = compile_expression(ref)
+            if expression is not None and has_key_path(ref, config):
+                # Keys containing operator characters, e.g. "app/name", take precedence over expressions
+                expression = None
+            if expression is not None and self.deferred_prefixes:
+                if any(x.startswith(self.deferred_prefixes) for x in expression.references):
+                    continue
             # Resolve reference, including subrefs
             try:
-                ref_val = self.resolve_subrefs(ref, config)
+                if expression is None:
+                    ref_val = self.resolve_subrefs(ref, config)
+                else:
+                    ref_val = self.__evaluate(expression, config, depth)
+                    if isinstance(ref_val, str):
+                        # Partially evaluated, the remaining references are resolved later
+                        default = f":{ref_match[2]}" if ref_match[2] is not None else ""
+                        new_value = new_value.replace(ref_match[0], "{{" + ref_val + default + "}}")
+                        continue
             except ReferenceNotFoundError as ref_err:
                 if default_value is not None:
                     ref_val = default_value
@@ -123,8 +158,8 @@ class ReferenceResolver(Resolver):
                     ref_val = None
 
             if ref_val is not None:
-                if operation:
-                    ref_val = operation.apply(ref_val)
+                if self.stats is not None:
+                    self.stats.references_resolved += 1
                 # Check if the reference to be resolved is part of a string.
                 if ref_match[0] == value:
                     # Preserve float & int and list types if reference is part of a string
@@ -146,6 +181,37 @@ class ReferenceResolver(Resolver):
         new_value = self.resolve_reference(new_value, config, depth + 1)
         return new_value
 
+    def __evaluate(self, expression: Expression, config: dict, depth: int) -> Any:
+        """
+        Returns the value of an arithmetic expression.
+        If only some of its references can be resolved and partial_expressions is set,
+        the expression with their values substituted is returned.
+        """
+        values = {}
+        for name in expression.references:
+            try:
+                value = self.__operand(name, config, depth)
+            except ReferenceNotFoundError:
+                continue
+            try:
+                values[name] = to_number(value)
+            except (TypeError, ValueError) as e:
+                raise ExtYamlSyntaxError(f"Unable to evaluate '{expression.text}': {e}")
+        if len(values) == len(set(expression.references)):
+            return expression.evaluate(values.__getitem__)
+        if not values or not self.partial_expressions:
+            raise ReferenceNotFoundError(expression.text)
+        return expression.substitute(values)
+
+    def __operand(self, name: str, config: dict, depth: int) -> Any:
+        value = self.resolve_subrefs(name, config)
+        if isinstance(value, str) and "{" in value:
+            value = self.resolve_reference(value, config, depth + 1)
+            if isinstance(value, str) and "{" in value:
+                # Not resolved yet, e.g. within a loop body
+                raise ReferenceNotFoundError(name)
+        return value
+
     def resolve_subrefs(self, fullref: str, current_config: dict):
         if not fullref:
             return current_config
@@ -190,3 +256,16 @@ class ReferenceResolver(Resolver):
                 # Fail, because the reference cannot be found in config
                 raise ReferenceNotFoundError(fullref)
         return self.resolve_subrefs(sub_ref, current_config)
+
+
+def has_key_path(ref: str, config: Any) -> bool:
+    """Returns True, if the dotted key path ref exists within config. List items are addressed by their index."""
+    value = config
+    for key in ref.split("."):
+        if isinstance(value, list) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        elif isinstance(value, Mapping) and key in value:
+            value = value[key]
+        else:
+            return False
+    return True
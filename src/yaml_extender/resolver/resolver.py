@@ -1,16 +1,33 @@
 from __future__ import annotations
 
 import abc
-from typing import Any
+from typing import TYPE_CHECKING, Any
+
+from yaml_extender.stats import ResolveStats
+from yaml_extender.tracing import NULL_SPAN, Tracer
+
+if TYPE_CHECKING:
+    from yaml_extender.limits import ResolveBudget
 
 
 class Resolver(abc.ABC):
-    def __init__(self, fail_on_resolve: bool = True):
+    def __init__(
+        self,
+        fail_on_resolve: bool = True,
+        stats: ResolveStats | None = None,
+        tracer: Tracer | None = None,
+    ):
         """
         Parameters
             fail_on_resolve: Flag if the parsing should be aborted if a value fails to resolve
+            stats: Optional statistics object, which is updated during resolution
+            tracer: Optional tracer, which records spans of expensive resolution steps
         """
         self.fail_on_resolve: bool = fail_on_resolve
+        self.stats: ResolveStats | None = stats
+        self.tracer: Tracer | None = tracer
+        # Optional resource budget, which aborts the resolution once exceeded
+        self.budget: ResolveBudget | None = None
         super().__init__()
 
     def resolve(self, content: Any, config: dict = None) -> dict:
@@ -18,6 +35,12 @@ class Resolver(abc.ABC):
             config = content
         return self.__resolve(content, config)
 
+    def _span(self, name: str, **args):
+        """Returns a tracing span for the given step or a no-op context if tracing is disabled"""
+        if self.tracer is None:
+            return NULL_SPAN
+        return self.tracer.span(name, type(self).__name__, **args)
+
     @abc.abstractmethod
     def __resolve(self, cur_value: Any, config: dict) -> dict:
         raise NotImplementedError
@@ -0,0 +1,140 @@
+"""
+Selective resolution of key paths.
+
+A document is pruned to the selected key paths and the values they reference, before includes, loops and references
+are resolved. Includes and loops outside of these paths are never read or expanded. References are detected
+conservatively, so some unreferenced values may be resolved as well.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Set, Tuple
+
+from yaml_extender.frozen import freeze
+from yaml_extender.resolver.include_prefetcher import IncludePrefetcher
+from yaml_extender.resolver.include_resolver import INCLUDE_KEY, IncludeResolver
+from yaml_extender.resolver.inline_loop_resolver import INLINE_LOOP_REGEX
+from yaml_extender.resolver.loop_resolver import LOOP_KEY, LOOP_REGEX
+from yaml_extender.resolver.expression import compile_expression
+from yaml_extender.xyml_exception import ReferenceNotFoundError
+
+KeyPath = Tuple[str, ...]
+
+# Text of a reference up to its end, its default value or a nested reference
+REFERENCE_NAME_REGEX = r"\{\{([^{}:]*)"
+
+
+def parse_path(path: str) -> KeyPath:
+    """Returns the keys of a dotted path, e.g. 'services.web'"""
+    return tuple(x.strip() for x in path.split(".") if x.strip())
+
+
+def is_covered(path: KeyPath, paths: Iterable[KeyPath]) -> bool:
+    """Returns True, if path lies within one of paths"""
+    return any(path[: len(x)] == x for x in paths)
+
+
+def prune(value: Any, paths: Set[KeyPath]) -> Any:
+    """
+    Returns value reduced to the given key paths. Include statements along the paths are kept.
+    Lists and loops are kept as a whole, as their items can only be addressed after their expansion.
+    """
+    if () in paths or not isinstance(value, dict) or LOOP_KEY in value:
+        return value
+    children: Dict[str, Set[KeyPath]] = {}
+    for path in paths:
+        children.setdefault(path[0], set()).add(path[1:])
+    pruned = {k: prune(v, children[str(k)]) for k, v in value.items() if str(k) in children}
+    if INCLUDE_KEY in value:
+        pruned[INCLUDE_KEY] = value[INCLUDE_KEY]
+    return pruned
+
+
+def dependencies(value: Any) -> Iterator[KeyPath]:
+    """Yields the key paths of all values, which value references or iterates"""
+    if isinstance(value, dict):
+        if LOOP_KEY in value:
+            for loop in str(value[LOOP_KEY]).split(","):
+                match = re.search(LOOP_REGEX, loop)
+                if match:
+                    yield parse_path(match[2])
+        for v in value.values():
+            yield from dependencies(v)
+    elif isinstance(value, list):
+        for x in value:
+            yield from dependencies(x)
+    elif isinstance(value, str) and "{{" in value:
+        for match in re.findall(INLINE_LOOP_REGEX, value):
+            yield parse_path(match[2])
+        for reference in re.findall(REFERENCE_NAME_REGEX, value):
+            # A reference may be a key containing operator characters or an expression, both are kept
+            expression = compile_expression(reference.strip())
+            for name in [reference.strip()] + (expression.references if expression is not None else []):
+                # Runtime values are no part of the document
+                if name and not name.startswith("xyml."):
+                    # Indices and nested references are resolved later, the whole value is kept
+                    yield parse_path(re.split(r"[\[{]", name)[0])
+
+
+def resolve_includes(
+    content: Any, paths: Set[KeyPath], inc_resolver: IncludeResolver, prefetcher: IncludePrefetcher | None = None
+) -> Tuple[Any, Set[KeyPath]]:
+    """
+    Resolves the includes of the selected paths and of all their dependencies.
+
+        Parameters:
+            content: Loaded document, which is not modified
+            paths: Selected key paths
+            inc_resolver: Resolver of the includes, which caches included files between the iterations
+            prefetcher: Prefetcher reading the includes of the reached values
+        Returns:
+            The pruned document with includes resolved and all key paths it depends on
+    """
+    paths = set(paths)
+    while True:
+        pruned = prune(content, paths)
+        # Include statements may reference other values as well
+        missing = missing_dependencies(pruned, paths)
+        if missing:
+            paths |= missing
+            continue
+        if prefetcher is not None:
+            prefetcher.scan(pruned, inc_resolver.include_dirs)
+        # Only the includes of the last iteration are counted, earlier ones are cached
+        inc_resolver.include_count = 0
+        resolved = prune(inc_resolver.resolve(freeze(pruned)), paths)
+        missing = missing_dependencies(resolved, paths)
+        if not missing:
+            return resolved, paths
+        paths |= missing
+
+
+def missing_dependencies(value: Any, paths: Set[KeyPath]) -> Set[KeyPath]:
+    """Returns the dependencies of value, which are not covered by paths"""
+    return {x for x in dependencies(value) if x and not is_covered(x, paths)}
+
+
+def select(content: Any, paths: List[KeyPath]) -> Any:
+    """
+    Returns the values at the given key paths of resolved content, nested in their parent mappings.
+    Paths into a list select the whole list.
+    """
+    if () in paths:
+        return content
+    selection: Dict = {}
+    for path in paths:
+        value, keys = content, []
+        for key in path:
+            if isinstance(value, list) and keys:
+                break
+            matches = [k for k in value if str(k) == key] if isinstance(value, dict) else []
+            if not matches:
+                raise ReferenceNotFoundError(".".join(path), key)
+            keys.append(matches[0])
+            value = value[matches[0]]
+        target = selection
+        for key in keys[:-1]:
+            target = target.setdefault(key, {})
+        target[keys[-1]] = value
+    return selection
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+
+class ResolveStats:
+    """Counters and timings collected while resolving and saving a XYmlFile"""
+
+    def __init__(self):
+        self.stage_times: Dict[str, float] = {}
+        self.nodes_visited: int = 0
+        # Included files read, includes reused from the include cache are not counted
+        self.includes_read: int = 0
+        # Include statements resolved, including reused ones
+        self.includes_resolved: int = 0
+        self.loops_expanded: int = 0
+        self.references_resolved: int = 0
+        self.max_include_depth: int = 0
+        self.max_reference_depth: int = 0
+        self.interned_duplicates: int = 0
+        self.interned_bytes: int = 0
+
+    def __repr__(self):
+        return f"ResolveStats({self.as_dict()})"
+
+    @contextmanager
+    def measure(self, stage: str):
+        """Adds the wall time spent within the context to the given stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_times[stage] = self.stage_times.get(stage, 0.0) + time.perf_counter() - start
+
+    def update_include_depth(self, depth: int):
+        if depth > self.max_include_depth:
+            self.max_include_depth = depth
+
+    def update_reference_depth(self, depth: int):
+        if depth > self.max_reference_depth:
+            self.max_reference_depth = depth
+
+    def merge(self, other: ResolveStats):
+        """Adds the counters of other, e.g. collected by a worker. Stage times are measured by the caller."""
+        self.nodes_visited += other.nodes_visited
+        self.includes_read += other.includes_read
+        self.includes_resolved += other.includes_resolved
+        self.loops_expanded += other.loops_expanded
+        self.references_resolved += other.references_resolved
+        self.update_include_depth(other.max_include_depth)
+        self.update_reference_depth(other.max_reference_depth)
+        self.interned_duplicates += other.interned_duplicates
+        self.interned_bytes += other.interned_bytes
+
+    def as_dict(self) -> dict:
+        return {
+            "stage_times": dict(self.stage_times),
+            "nodes_visited": self.nodes_visited,
+            "includes_read": self.includes_read,
+            "includes_resolved": self.includes_resolved,
+            "loops_expanded": self.loops_expanded,
+            "references_resolved": self.references_resolved,
+            "max_include_depth": self.max_include_depth,
+            "max_reference_depth": self.max_reference_depth,
+            "interned_duplicates": self.interned_duplicates,
+            "interned_bytes": self.interned_bytes,
+        }
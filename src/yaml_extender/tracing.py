@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+# Shared no-op context used for spans while tracing is disabled
+NULL_SPAN = contextlib.nullcontext()
+DEFAULT_SLOW_REFERENCE_THRESHOLD = 0.001
+
+
+class Tracer:
+    """
+    Records nested spans of the resolution in the Chrome trace event format.
+    The resulting file can be loaded in chrome://tracing, Perfetto or speedscope.
+    """
+
+    def __init__(self, slow_reference_threshold: float = DEFAULT_SLOW_REFERENCE_THRESHOLD):
+        """
+        Parameters
+            slow_reference_threshold: Minimum duration in seconds for a single reference to be recorded as span
+        """
+        self.slow_reference_threshold: float = slow_reference_threshold
+        self.events: List[Dict] = []
+        self._origin: float = time.perf_counter()
+        self._pid: int = os.getpid()
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str = "xyml", **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, category, start, time.perf_counter(), args)
+
+    def add_span(self, name: str, category: str, start: float, end: float, args: Dict | None = None):
+        """Adds a complete event for an already measured span, timestamps are taken from time.perf_counter"""
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start - self._origin) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": self._pid,
+            "tid": threading.get_ident(),
+        }
+        if args:
+            event["args"] = {k: str(v) for k, v in args.items()}
+        self.events.append(event)
+
+    def as_dict(self) -> dict:
+        return {"traceEvents": list(self.events), "displayTimeUnit": "ms"}
+
+    def save(self, path: str | Path):
+        with open(path, "w") as file:
+            json.dump(self.as_dict(), file)
@@ -10,6 +10,10 @@ class ReferenceNotFoundError(ExtYamlError):
         if self.subref:
             self.message += f" specified sub value {self.subref} not found."
 
+    def __reduce__(self):
+        # Errors are pickled, when they are raised in a worker process
+        return type(self), (self.reference, self.subref)
+
 
 class ExtYamlSyntaxError(ExtYamlError):
     pass
@@ -17,6 +21,27 @@ class ExtYamlSyntaxError(ExtYamlError):
 
 class RecursiveReferenceError(RecursionError):
     def __init__(self, reference):
+        self.reference = reference
         self.message = (
             f"Maximum recursive depth reached, while resolving {reference}. Is there a loop in your configuration?"
         )
+
+    def __reduce__(self):
+        return type(self), (self.reference,)
+
+
+class ResourceLimitError(ExtYamlError):
+    def __init__(self, message: str, statement=None):
+        super().__init__(message)
+        self.message = message
+        self.statement = statement
+
+    def __reduce__(self):
+        return type(self), (self.message, self.statement)
+
+
+class IncludeCycleError(ExtYamlError):
+    def __init__(self, chain):
+        self.chain = chain
+        self.message = f"Include cycle detected: {' -> '.join(str(x) for x in chain)}"
+        super().__init__(self.message)
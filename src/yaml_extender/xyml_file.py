@@ -1,56 +1,506 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import functools
+import hashlib
+import io
+import json
+import locale
 import os
+import shutil
+import threading
 import yaml
-from typing import Dict, List
+from collections import ChainMap
+from concurrent.futures import Executor
+from typing import IO, Any, Dict, List, Mapping, Set, Tuple
 from pathlib import Path
 
-from yaml_extender import yaml_loader
+from yaml_extender import selection, yaml_loader
+from yaml_extender.frozen import FrozenDict, FrozenList, freeze, thaw_all
+from yaml_extender.interning import Interner
+from yaml_extender.limits import LimitedStream, ResolveBudget, ResolveLimits
+import yaml_extender.logger as logger
+from yaml_extender.resolver.include_prefetcher import DEFAULT_PREFETCH_WORKERS, IncludePrefetcher
 from yaml_extender.resolver.include_resolver import IncludeResolver
 from yaml_extender.resolver.inline_loop_resolver import InlineLoopResolver
 from yaml_extender.resolver.loop_resolver import LoopResolver
 from yaml_extender.resolver.reference_resolver import ReferenceResolver
+from yaml_extender.stats import ResolveStats
+from yaml_extender.tracing import Tracer
+from yaml_extender.xyml_exception import ResourceLimitError
 
 ENV_KEY = "env"
 PARAM_KEY = "param"
+OUTPUT_FORMATS = ["yaml", "json"]
+# References, which depend on the environment of a resolution instead of the document
+RUNTIME_REFERENCE_PREFIXES = (f"xyml.{ENV_KEY}", f"xyml.{PARAM_KEY}")
+# Minimum number of nodes of a repeated subtree to be written as anchor
+DEFAULT_ANCHOR_MIN_SIZE = 10
+
+
+class XYmlDumper(yaml.Dumper):
+    """Dumps frozen nodes as plain mappings and sequences"""
+
+
+XYmlDumper.add_representer(FrozenDict, yaml.Dumper.represent_dict)
+XYmlDumper.add_representer(FrozenList, yaml.Dumper.represent_list)
+
+
+class NoAliasDumper(XYmlDumper):
+    """Writes nodes shared by reference in full at every occurrence instead of as alias"""
+
+    def ignore_aliases(self, data) -> bool:
+        return True
+
+
+class AnchorDumper(XYmlDumper):
+    """Writes the given subtrees with an anchor at their first occurrence and as alias at every further one"""
+
+    def __init__(self, stream: IO[str], anchored_ids: Set[int], **kwargs):
+        super().__init__(stream, **kwargs)
+        self.anchored_ids: Set[int] = anchored_ids
+
+    def ignore_aliases(self, data) -> bool:
+        return id(data) not in self.anchored_ids
+
+
+def repeated_subtrees(content: Any, min_size: int) -> Set[int]:
+    """
+    Returns the ids of all containers within content, which occur more than once and have at least min_size nodes.
+    Equal subtrees must be identical objects, e.g. by interning the content.
+    """
+    occurrences: Dict[int, int] = {}
+    sizes: Dict[int, int] = {}
+
+    def visit(value: Any) -> int:
+        if not isinstance(value, (dict, list)):
+            return 1
+        occurrences[id(value)] = occurrences.get(id(value), 0) + 1
+        if id(value) not in sizes:
+            # Repeated subtrees are written as alias, so their children are only counted once
+            children = value.values() if isinstance(value, dict) else value
+            sizes[id(value)] = 1 + sum(visit(x) for x in children)
+        return sizes[id(value)]
+
+    visit(content)
+    return {key for key, count in occurrences.items() if count > 1 and sizes[key] >= min_size}
 
 
 class XYmlFile:
-    def __init__(self, filepath: Path, params: Dict = None, include_dirs: List[Path] | None = None):
-        self.params = params
+    def __init__(
+        self,
+        filepath: Path,
+        params: Dict = None,
+        include_dirs: List[Path] | None = None,
+        collect_stats: bool = False,
+        tracer: Tracer | None = None,
+        prefetch_workers: int = 0,
+        prefetcher: IncludePrefetcher | None = None,
+        resolve_runtime_refs: bool = True,
+        intern_content: bool = False,
+        limits: ResolveLimits | None = None,
+        thread_safe: bool = False,
+        parallel_workers: int = 0,
+        select: List[str] | None = None,
+    ):
+        """
+        Parameters
+            filepath: Path of the file to be resolved
+            params: Parameters, which can be referenced using xyml.param
+            include_dirs: Additional directories to search for included files
+            collect_stats: Collect resolution statistics, available as stats attribute
+            tracer: Tracer recording spans of the resolution
+            prefetch_workers: Number of threads reading included files ahead of resolution, 0 disables prefetching
+            prefetcher: Shared prefetcher, which caches included files across multiple XYmlFiles.
+                        It is not closed by the XYmlFile and takes precedence over prefetch_workers.
+            resolve_runtime_refs: If False, references to xyml.param and xyml.env are kept unresolved,
+                                  e.g. to compile the file into an artifact, which is rendered later.
+            intern_content: Deduplicate equal strings and subtrees of the resolved content, see XYmlFile.intern
+            limits: Resource limits of the resolution and the output size, a ResourceLimitError is raised if exceeded
+            thread_safe: Freeze the document and parameters before the resolution, so they are never modified.
+                         Required, if they are shared with other threads, see XYmlFile.from_content.
+            parallel_workers: Number of processes resolving the top-level values of the document concurrently,
+                              after includes were resolved. 0 or 1 resolves serially.
+            select: Dotted key paths, e.g. "services.web". Only these values and the values they reference are
+                    resolved, the content only contains the selected values within their parent mappings.
+        """
+        self._configure(
+            filepath.absolute(),
+            filepath.parent,
+            params,
+            include_dirs,
+            collect_stats,
+            tracer,
+            prefetch_workers,
+            prefetcher,
+            resolve_runtime_refs,
+            intern_content,
+            limits,
+            thread_safe,
+            parallel_workers,
+            select,
+        )
+        with self._measure("load"):
+            self.content = yaml_loader.load(str(self.filepath), tracer=self.tracer)
+        self.content = self.resolve()
+
+    def _configure(
+        self,
+        filepath: Path | None,
+        root_dir: Path,
+        params: Dict,
+        include_dirs: List[Path] | None,
+        collect_stats: bool = False,
+        tracer: Tracer | None = None,
+        prefetch_workers: int = 0,
+        prefetcher: IncludePrefetcher | None = None,
+        resolve_runtime_refs: bool = True,
+        intern_content: bool = False,
+        limits: ResolveLimits | None = None,
+        thread_safe: bool = False,
+        parallel_workers: int = 0,
+        select: List[str] | None = None,
+    ):
+        self.thread_safe = thread_safe
+        self.parallel_workers = parallel_workers
+        self.select: List[selection.KeyPath] | None = [selection.parse_path(x) for x in select] if select else None
+        # Resolvers copy frozen nodes instead of modifying them, so shared input stays untouched
+        self.params = freeze(params) if thread_safe else params
+        self.prefetch_workers = prefetch_workers
+        self.prefetcher: IncludePrefetcher | None = prefetcher
+        self.resolve_runtime_refs = resolve_runtime_refs
+        self.intern_content = intern_content
+        self.limits: ResolveLimits | None = limits
+        # Statistics and traces are only collected on request, to keep the resolution overhead minimal
+        self.stats: ResolveStats | None = ResolveStats() if collect_stats else None
+        self.tracer: Tracer | None = tracer
         if include_dirs:
-            self.include_dirs: List[Path] = include_dirs
+            self.include_dirs: List[Path] = list(include_dirs)
         else:
             self.include_dirs: List[Path] = []
-        self.filepath = filepath.absolute()
-        self.root_dir = filepath.parent
+        self.filepath: Path | None = filepath
+        self.root_dir = root_dir
         # Use root_dir and cwd as default include paths.
         if self.root_dir not in self.include_dirs:
             self.include_dirs.append(self.root_dir)
         if Path.cwd() not in self.include_dirs:
             self.include_dirs.append(Path.cwd())
-        self.content = yaml_loader.load(str(self.filepath))
-        self.content = self.resolve()
+
+    @classmethod
+    def from_stream(
+        cls,
+        stream: IO[str] | str,
+        params: Dict = None,
+        include_dirs: List[Path] | None = None,
+        root_dir: Path | None = None,
+        **kwargs,
+    ) -> XYmlFile:
+        """
+        Resolves extended yaml content read from a stream, without the need for a file.
+
+            Parameters:
+                root_dir: Directory used to resolve relative includes in place of the files directory,
+                          defaults to the current working directory.
+                For the other parameters see XYmlFile.
+        """
+        xyml_file = cls.__new__(cls)
+        xyml_file._configure(None, root_dir or Path.cwd(), params, include_dirs, **kwargs)
+        with xyml_file._measure("load"):
+            xyml_file.content = yaml_loader.parse(stream)
+        xyml_file.content = xyml_file.resolve()
+        return xyml_file
+
+    @classmethod
+    def from_content(
+        cls,
+        content: Any,
+        params: Dict = None,
+        include_dirs: List[Path] | None = None,
+        root_dir: Path | None = None,
+        **kwargs,
+    ) -> XYmlFile:
+        """
+        Resolves an already parsed document, see from_stream for the parameters.
+        The document is modified during resolution, unless thread_safe is set or it is frozen.
+        """
+        xyml_file = cls.__new__(cls)
+        xyml_file._configure(None, root_dir or Path.cwd(), params, include_dirs, **kwargs)
+        xyml_file.content = content
+        xyml_file.content = xyml_file.resolve()
+        return xyml_file
+
+    @classmethod
+    def from_string(cls, text: str, params: Dict = None, include_dirs: List[Path] | None = None, **kwargs) -> XYmlFile:
+        """Resolves extended yaml content given as string, see from_stream for the parameters"""
+        return cls.from_stream(text, params, include_dirs, **kwargs)
+
+    @classmethod
+    def from_artifact(cls, artifact: Path | bytes, params: Dict = None, **kwargs) -> XYmlFile:
+        """
+        Renders a precompiled .xymlc artifact (see yaml_extender.artifact) with the given parameters.
+        Only references to xyml.param and xyml.env are resolved, includes and loops were resolved on compilation.
+        """
+        from yaml_extender import artifact as xyml_artifact
+
+        xyml_file = cls.__new__(cls)
+        if isinstance(artifact, bytes):
+            xyml_file._configure(None, Path.cwd(), params, None, **kwargs)
+            data = artifact
+        else:
+            xyml_file._configure(artifact.absolute(), artifact.parent, params, None, **kwargs)
+            data = artifact.read_bytes()
+        with xyml_file._measure("render"):
+            xyml_file.content = xyml_artifact.render(data, params)
+        xyml_file.content = xyml_file._finish(xyml_file.content)
+        return xyml_file
 
     def __repr__(self):
-        return yaml.dump(self.content)
+        return yaml.dump(self.content, Dumper=XYmlDumper)
+
+    @classmethod
+    async def aload(
+        cls,
+        filepath: Path,
+        params: Dict = None,
+        include_dirs: List[Path] | None = None,
+        prefetcher: IncludePrefetcher | None = None,
+        executor: Executor | None = None,
+        **kwargs,
+    ) -> XYmlFile:
+        """
+        Loads and resolves a XYmlFile without blocking the running event loop.
+
+        Reading and resolution run in executor (the loops default executor if None), while included files are
+        read concurrently by the prefetcher. Concurrent loads can share one prefetcher as include cache.
+        """
+        if prefetcher is None:
+            kwargs.setdefault("prefetch_workers", DEFAULT_PREFETCH_WORKERS)
+        load = functools.partial(cls, filepath, params, include_dirs, prefetcher=prefetcher, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(executor, load)
+
+    def _measure(self, stage: str):
+        if self.stats is None and self.tracer is None:
+            return contextlib.nullcontext()
+        measurements = contextlib.ExitStack()
+        if self.stats is not None:
+            measurements.enter_context(self.stats.measure(stage))
+        if self.tracer is not None:
+            measurements.enter_context(self.tracer.span(stage, "stage"))
+        return measurements
 
     def resolve(self):
-        inc_resolver = IncludeResolver(self.include_dirs, False)
-        processed_content = inc_resolver.resolve(self.content)
-        loop_resolver = LoopResolver(False)
-        processed_content = loop_resolver.resolve(processed_content)
-        inline_loop_resolver = InlineLoopResolver(False)
-        processed_content = inline_loop_resolver.resolve(processed_content)
-        # Extend config for resolution by ENV and PARAM statements
-        config = processed_content.copy()
-        config["xyml"] = {}
-        config["xyml"][ENV_KEY] = os.environ
-        config["xyml"][PARAM_KEY] = self.params
-        ref_resolver = ReferenceResolver(False)
-        processed_content = ref_resolver.resolve(processed_content, config)
+        if self.thread_safe:
+            self.content = freeze(self.content)
+        budget = self.limits.start() if self.limits is not None else None
+        with self._measure("include"), contextlib.ExitStack() as include_context:
+            prefetcher = self.prefetcher
+            if prefetcher is None and self.prefetch_workers > 0:
+                prefetcher = include_context.enter_context(IncludePrefetcher(self.prefetch_workers, self.tracer))
+            inc_resolver = IncludeResolver(self.include_dirs, False, self.stats, self.tracer, prefetcher)
+            inc_resolver.budget = budget
+            if self.filepath is not None:
+                # A file including itself is a cycle
+                inc_resolver.include_stack = [((str(self.filepath.resolve()), ()), self.filepath.name)]
+            if self.select is not None:
+                # Includes outside of the selected values and their dependencies are never read
+                processed_content, _ = selection.resolve_includes(
+                    self.content, set(self.select), inc_resolver, prefetcher
+                )
+            else:
+                if prefetcher is not None:
+                    prefetcher.scan(self.content, inc_resolver.include_dirs)
+                processed_content = inc_resolver.resolve(self.content)
+        if self.stats is not None:
+            self.stats.includes_resolved += inc_resolver.include_count
+        deferred_prefixes = () if self.resolve_runtime_refs else RUNTIME_REFERENCE_PREFIXES
+        if self.parallel_workers > 1:
+            from yaml_extender.parallel import can_resolve_parallel
+
+            if can_resolve_parallel(processed_content):
+                return self._resolve_parallel(processed_content, budget, deferred_prefixes, inc_resolver.include_count)
+            logger.info("Top-level values cannot be resolved independently, resolving serially")
+        with self._measure("loop"):
+            loop_resolver = LoopResolver(False, self.stats, self.tracer)
+            loop_resolver.budget = budget
+            processed_content = loop_resolver.resolve(processed_content)
+        with self._measure("inline_loop"):
+            inline_loop_resolver = InlineLoopResolver(False, self.stats, self.tracer)
+            inline_loop_resolver.budget = budget
+            processed_content = inline_loop_resolver.resolve(processed_content)
+        config = reference_config(processed_content, self.params)
+        with self._measure("reference"):
+            ref_resolver = ReferenceResolver(False, self.stats, self.tracer, deferred_prefixes)
+            ref_resolver.budget = budget
+            processed_content = ref_resolver.resolve(processed_content, config)
+        logger.info(
+            "Resolved %s: %d includes, %d loops, %d inline loops",
+            self.filepath or "<stream>",
+            inc_resolver.include_count,
+            loop_resolver.loop_count,
+            inline_loop_resolver.loop_count,
+        )
+        return self._finish(processed_content)
+
+    def _resolve_parallel(
+        self, content: dict, budget: ResolveBudget | None, deferred_prefixes: Tuple[str, ...], include_count: int
+    ) -> Any:
+        """Resolves loops and references of the top-level values in a pool, see yaml_extender.parallel"""
+        from yaml_extender.parallel import ParallelResolver
+
+        resolver = ParallelResolver(self.parallel_workers, self.stats, budget, deferred_prefixes)
+        with self._measure("loop"):
+            content = resolver.resolve_loops(content)
+        with self._measure("reference"):
+            content = resolver.resolve_references(content, self.params)
+        logger.info(
+            "Resolved %s in parallel: %d includes, %d loops, %d inline loops",
+            self.filepath or "<stream>",
+            include_count,
+            resolver.loop_count,
+            resolver.inline_loop_count,
+        )
+        return self._finish(content)
+
+    def _finish(self, processed_content: Any) -> Any:
+        if self.select is not None:
+            processed_content = selection.select(processed_content, self.select)
+        if self.intern_content:
+            processed_content, _ = self._intern_content(processed_content)
+        elif not self.thread_safe:
+            # Shared content of included files is frozen, the content of the file stays a plain, mutable document
+            processed_content = thaw_all(processed_content)
         return processed_content
 
-    def save(self, path: str, sort_keys=False):
-        with open(path, "w") as file:
-            yaml.dump(self.content, file, sort_keys=sort_keys)
+    def intern(self, interner: Interner | None = None) -> int:
+        """
+        Replaces equal strings and subtrees of the content by one shared, immutable instance.
+
+            Parameters:
+                interner: Interner shared with other files, so equal content is also shared between them
+            Returns:
+                Estimated memory saved in bytes
+        """
+        self.content, saved_bytes = self._intern_content(self.content, interner)
+        return saved_bytes
+
+    def _intern_content(self, content: Any, interner: Interner | None = None) -> Tuple[Any, int]:
+        interner = interner or Interner()
+        duplicates, saved_bytes = interner.duplicates, interner.saved_bytes
+        with self._measure("intern"):
+            content = interner.intern(content)
+        duplicates, saved_bytes = interner.duplicates - duplicates, interner.saved_bytes - saved_bytes
+        if self.stats is not None:
+            self.stats.interned_duplicates += duplicates
+            self.stats.interned_bytes += saved_bytes
+        logger.info("Interning replaced %d duplicates, saving about %d bytes", duplicates, saved_bytes)
+        return content, saved_bytes
+
+    def save(
+        self,
+        path: str,
+        sort_keys=False,
+        output_format: str = "yaml",
+        only_if_changed: bool = False,
+        anchor_min_size: int | None = None,
+        aliases: bool = True,
+    ) -> bool:
+        """
+        Saves the resolved content to path.
+
+            Parameters:
+                only_if_changed: Only replace the file if its content differs, which keeps its modification time
+                                 for unchanged content. The file is replaced atomically.
+                anchor_min_size: Write equal subtrees with at least this many nodes only once, using yaml anchors
+                                 and aliases for repeated occurrences. Disabled if None.
+                aliases: Write subtrees shared by reference once, using yaml anchors and aliases.
+                         If False, every occurrence is written in full.
+            Returns:
+                True if the file was written, False if it was unchanged.
+        """
+        with self._measure("dump"):
+            if not only_if_changed:
+                try:
+                    with open(path, "w") as file:
+                        self.dump(file, sort_keys, output_format, anchor_min_size, aliases)
+                except ResourceLimitError:
+                    # Don't leave a truncated output behind
+                    Path(path).unlink()
+                    raise
+                return True
+            buffer = io.StringIO()
+            self.dump(buffer, sort_keys, output_format, anchor_min_size, aliases)
+            data = buffer.getvalue().encode(locale.getpreferredencoding(False))
+            path = Path(path)
+            if (
+                path.is_file()
+                and path.stat().st_size == len(data)
+                and file_digest(path) == hashlib.sha256(data).digest()
+            ):
+                return False
+            # Write a temporary file next to the target, which can be renamed atomically
+            tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            try:
+                with open(tmp_path, "xb") as file:
+                    file.write(data)
+                if path.is_file():
+                    shutil.copymode(path, tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+            return True
+
+    def dump(
+        self,
+        stream: IO[str],
+        sort_keys=False,
+        output_format: str = "yaml",
+        anchor_min_size: int | None = None,
+        aliases: bool = True,
+    ):
+        """Writes the resolved content to stream in the given output format, see save for the parameters"""
+        if anchor_min_size is not None and output_format != "yaml":
+            raise ValueError("Anchors are only supported for yaml output.")
+        if self.limits is not None and self.limits.max_output_bytes is not None:
+            stream = LimitedStream(stream, self.limits.max_output_bytes)
+        if output_format == "json":
+            # Values without JSON representation, e.g. dates, are written as string
+            encoder = json.JSONEncoder(sort_keys=sort_keys, indent=2, default=str)
+            for chunk in encoder.iterencode(self.content):
+                stream.write(chunk)
+            stream.write("\n")
+        elif output_format == "yaml" and anchor_min_size is not None:
+            # Equal subtrees become identical objects, which are written once
+            content = Interner().intern(self.content)
+            dumper = AnchorDumper(stream, repeated_subtrees(content, anchor_min_size), sort_keys=sort_keys)
+            try:
+                dumper.open()
+                dumper.represent(content)
+                dumper.close()
+            finally:
+                dumper.dispose()
+        elif output_format == "yaml":
+            yaml.dump(self.content, stream, Dumper=XYmlDumper if aliases else NoAliasDumper, sort_keys=sort_keys)
+        else:
+            raise ValueError(f"Unsupported output format '{output_format}', use one of {OUTPUT_FORMATS}")
+
+
+def reference_config(content: dict, params: Dict | None) -> Mapping:
+    """
+    Returns the config used for the resolution of references in content.
+    ENV and PARAM statements are layered on top of the document, which is neither copied nor modified.
+    """
+    runtime_config = {"xyml": {ENV_KEY: os.environ, PARAM_KEY: params}}
+    if not isinstance(content, dict):
+        return ChainMap(runtime_config)
+    return ChainMap(runtime_config, content)
+
+
+def file_digest(path: Path) -> bytes:
+    """Returns the sha256 digest of a file, which is read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.digest()
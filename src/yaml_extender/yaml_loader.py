@@ -1,10 +1,18 @@
+from __future__ import annotations
+
 from pathlib import Path
-import yaml
+from typing import IO, TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from yaml_extender.tracing import Tracer
 
 VALID_YAML_SUFFIXES = [".yaml", ".yml", ".xyml"]
 
 
-def load(path: str) -> dict:
+def load(path: str, tracer: Tracer | None = None) -> dict:
+    # PyYAML is imported on demand, to keep the import of value parsing helpers cheap
+    import yaml
+
     if not any(path.endswith(suffix) for suffix in VALID_YAML_SUFFIXES):
         # Add yaml suffix if the filepath is missing it
         possible_paths = [Path(path + suffix) for suffix in VALID_YAML_SUFFIXES]
@@ -17,11 +25,25 @@ def load(path: str) -> dict:
         valid_path = Path(path)
         if not valid_path.is_file():
             raise FileNotFoundError(f"Unable to resolve {path}")
-    with open(valid_path, "r") as file:
-        content = yaml.safe_load(file)
+    if tracer is None:
+        with open(valid_path, "r") as file:
+            content = yaml.safe_load(file)
+        return content
+    with tracer.span("read", "yaml_loader", path=valid_path):
+        with open(valid_path, "r") as file:
+            text = file.read()
+    with tracer.span("parse", "yaml_loader", path=valid_path):
+        content = yaml.safe_load(text)
     return content
 
 
+def parse(stream: IO[str] | str) -> Any:
+    """Parses yaml content from a stream or string"""
+    import yaml
+
+    return yaml.safe_load(stream)
+
+
 def parse_numeric_value(value: str):
     try:
         return int(value)
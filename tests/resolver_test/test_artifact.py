@@ -0,0 +1,64 @@
+from pathlib import Path
+
+import pytest
+import yaml
+
+from yaml_extender import artifact
+from yaml_extender.xyml_file import XYmlFile
+
+script_dir = Path(__file__).parent
+res_dir = script_dir.parent / "resources"
+
+
+def test_compile_and_render(tmp_path):
+    artifact_path = tmp_path / "root.xymlc"
+    artifact.compile_file(res_dir / "root.yaml", artifact_path, [res_dir / "subdir"])
+    expected = yaml.safe_load((res_dir / "expected_file.yaml").read_text())
+
+    rendered = XYmlFile.from_artifact(artifact_path, {"user": "simon", "empty": ""})
+    assert rendered.content == expected
+    rendered = XYmlFile.from_artifact(artifact_path, {"user": "someone", "empty": "set"})
+    assert rendered.content["user_content"] == "someone"
+    assert rendered.content["empty_param"] == "empty param is set"
+
+
+def test_only_runtime_references_remain(monkeypatch):
+    text = """
+names:
+- a
+- b
+user: "{{ xyml.param.user }}"
+greeting: "hello {{ user }} from {{ names.0 }}"
+home: "{{ xyml.env.XYML_TEST_HOME:/home }}"
+labels:
+  xyml.for: name:names
+  label: "{{ name }}-{{ xyml.param.suffix }}"
+"""
+    data = artifact.dumps(XYmlFile.from_string(text, resolve_runtime_refs=False).content)
+    compiled, templates = artifact.loads(data)
+    assert compiled["greeting"] == "hello {{ xyml.param.user }} from a"
+    assert compiled["labels"] == [{"label": "a-{{ xyml.param.suffix }}"}, {"label": "b-{{ xyml.param.suffix }}"}]
+    assert [path for path, _ in templates] == [
+        ("user",),
+        ("greeting",),
+        ("home",),
+        ("labels", 0, "label"),
+        ("labels", 1, "label"),
+    ]
+
+    monkeypatch.setenv("XYML_TEST_HOME", "/home/me")
+    rendered = artifact.render(data, {"user": "me", "suffix": 1})
+    assert rendered["greeting"] == "hello me from a"
+    assert rendered["home"] == "/home/me"
+    assert rendered["labels"] == [{"label": "a-1"}, {"label": "b-1"}]
+
+
+def test_render_list_parameter():
+    compiled = {"args": ["first", "{{ xyml.param.extra }}", "{{ xyml.param.last }}"]}
+    rendered = artifact.render(artifact.dumps(compiled), {"extra": ["x", "y"], "last": "z"})
+    assert rendered == {"args": ["first", "x", "y", "z"]}
+
+
+def test_invalid_artifact():
+    with pytest.raises(ValueError):
+        artifact.loads(b"no artifact")
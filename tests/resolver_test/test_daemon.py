@@ -0,0 +1,86 @@
+import io
+import os
+import socket
+import threading
+from pathlib import Path
+from unittest import mock
+
+import pytest
+import yaml
+
+from yaml_extender import yaml_loader
+from yaml_extender.artifact import compile_file
+from yaml_extender.daemon import ResolverDaemon, request
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix domain sockets required")
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    with ResolverDaemon(tmp_path / "xyml.sock", prefetch_workers=2) as daemon:
+        thread = threading.Thread(target=daemon.serve_forever)
+        thread.start()
+        yield daemon
+        daemon.shutdown()
+        thread.join()
+
+
+def run(daemon: ResolverDaemon, argv, stdin: str = ""):
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    exit_code = request(daemon.socket_path, argv, io.StringIO(stdin), stdout, stderr)
+    return exit_code, stdout.getvalue(), stderr.getvalue()
+
+
+def test_daemon_resolve(daemon, tmp_path, monkeypatch):
+    (tmp_path / "inc.yaml").write_text("value: abc\n")
+    (tmp_path / "root.yaml").write_text("root:\n  xyml.include: inc.yaml\nparam: '{{xyml.param.number}}'\n")
+    monkeypatch.chdir(tmp_path)
+    real_load = yaml_loader.load
+    loaded = []
+
+    def load(path, **kwargs):
+        loaded.append(Path(path).name)
+        return real_load(path, **kwargs)
+
+    with mock.patch("yaml_extender.yaml_loader.load", side_effect=load):
+        for i in range(3):
+            exit_code, stdout, _ = run(daemon, ["root.yaml", f"out_{i}.yaml", "-q", "--number", str(i)])
+            assert exit_code == 0
+            assert stdout == ""
+            assert yaml.safe_load((tmp_path / f"out_{i}.yaml").read_text()) == {"root": {"value": "abc"}, "param": i}
+        # Changed includes are read again
+        (tmp_path / "inc.yaml").write_text("value: changed\n")
+        run(daemon, ["root.yaml", "-", "-q", "--number", "3"])
+
+    assert loaded.count("inc.yaml") == 2
+    exit_code, stdout, _ = run(daemon, ["root.yaml", "-", "-q", "--number", "3"])
+    assert yaml.safe_load(stdout) == {"root": {"value": "changed"}, "param": 3}
+    assert daemon.request_count == 5
+
+
+def test_daemon_stdin_and_errors(daemon, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    exit_code, stdout, _ = run(daemon, ["-", "-", "-q", "--format", "json"], stdin="a: 1\nb: '{{a}}'\n")
+    assert exit_code == 0
+    assert yaml.safe_load(stdout) == {"a": 1, "b": 1}
+
+    exit_code, _, stderr = run(daemon, ["missing.xymlc", "out.yaml", "-q"])
+    assert exit_code == 1
+    assert "FileNotFoundError" in stderr
+
+    exit_code, _, stderr = run(daemon, ["serve"])
+    assert exit_code == 2
+
+
+def test_daemon_artifact(daemon, tmp_path, monkeypatch):
+    (tmp_path / "root.yaml").write_text("name: '{{xyml.env.XYML_TEST_NAME}}'\n")
+    compile_file(tmp_path / "root.yaml", tmp_path / "root.xymlc")
+    monkeypatch.chdir(tmp_path)
+    # The environment of the client is used
+    monkeypatch.setenv("XYML_TEST_NAME", "client")
+
+    exit_code, stdout, _ = run(daemon, ["root.xymlc", "-", "-q"])
+    assert exit_code == 0
+    assert yaml.safe_load(stdout) == {"name": "client"}
+    assert "XYML_TEST_NAME" in os.environ
@@ -0,0 +1,49 @@
+import pytest
+
+from yaml_extender.resolver.expression import compile_expression
+from yaml_extender.xyml_exception import ExtYamlSyntaxError
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("idx * 10 + 8000", 8030),
+        ("8000 + idx * 10", 8030),
+        ("(idx + 1) * 2", 8),
+        ("idx - 1", 2),
+        ("-idx", -3),
+        ("idx - -2", 5),
+        ("7 // 2 + idx % 2", 4),
+        ("idx / 2", 1.5),
+        ("a.b-c * 2", 4),
+        ("value * 2", 5.0),
+    ],
+)
+def test_evaluate(text, expected):
+    values = {"idx": 3, "a.b-c": 2, "value": "2.5"}
+    assert compile_expression(text).evaluate(values.__getitem__) == expected
+
+
+@pytest.mark.parametrize("text", ["idx", "a.b", "my-key", "(idx", "idx +", "idx idx", "path with spaces"])
+def test_no_expression(text):
+    assert compile_expression(text) is None
+
+
+def test_compile_once():
+    expression = compile_expression("x*2 + 3 * 4")
+    assert compile_expression("x*2 + 3 * 4") is expression
+    assert expression.references == ["x"]
+    assert compile_expression("2 * (3 + 4)").constant == 14
+
+
+def test_substitute():
+    expression = compile_expression("a * b + c")
+    assert expression.substitute({"a": 2, "c": -1}) == "2 * b + (-1)"
+    assert compile_expression(expression.substitute({"a": 2, "c": -1})).evaluate({"b": 3}.__getitem__) == 5
+
+
+def test_evaluation_errors():
+    with pytest.raises(ExtYamlSyntaxError):
+        compile_expression("a / 0").evaluate({"a": 1}.__getitem__)
+    with pytest.raises(ExtYamlSyntaxError):
+        compile_expression("a + 1").evaluate({"a": "text"}.__getitem__)
@@ -0,0 +1,97 @@
+import copy
+import io
+import pickle
+
+import pytest
+import yaml
+
+from yaml_extender.artifact import dumps, render
+from yaml_extender.frozen import FrozenDict, FrozenList, freeze, thaw, thaw_all, thaw_path
+from yaml_extender.xyml_file import XYmlFile
+
+
+def test_freeze():
+    frozen = freeze({"a": [1, {"b": 2}]})
+    assert isinstance(frozen, FrozenDict)
+    assert isinstance(frozen["a"], FrozenList)
+    assert frozen == {"a": [1, {"b": 2}]}
+    with pytest.raises(TypeError):
+        frozen["c"] = 3
+    with pytest.raises(TypeError):
+        frozen["a"].append(3)
+    # Immutable nodes are shared instead of copied
+    assert copy.deepcopy(frozen) is frozen
+    assert freeze(frozen) is frozen
+    assert pickle.loads(pickle.dumps(frozen)) == frozen
+
+
+def test_thaw_path():
+    frozen = freeze({"a": {"b": {"c": 1}}, "d": {"e": 2}})
+    root, node = thaw_path(frozen, ["a", "b"])
+    node["c"] = 3
+    assert root == {"a": {"b": {"c": 3}}, "d": {"e": 2}}
+    assert frozen["a"]["b"]["c"] == 1
+    # Nodes outside of the path stay shared
+    assert root["d"] is frozen["d"]
+    assert type(thaw(frozen)) is dict
+
+
+def test_shared_include(tmp_path):
+    (tmp_path / "inc.yaml").write_text("value:\n  list: [1, 2]\nparam: '{{name}}'\n")
+    xyml_file = XYmlFile.from_string(
+        """
+a:
+  xyml.include: inc.yaml<<name=x>>
+b:
+  xyml.include: inc.yaml<<name=x>>
+c:
+  xyml.include: inc.yaml<<name=y>>
+""",
+        include_dirs=[tmp_path],
+        thread_safe=True,
+    )
+    content = xyml_file.content
+    assert content["c"] == {"value": {"list": [1, 2]}, "param": "y"}
+    # Unmodified parts of included files are shared without copying
+    assert content["a"]["value"] is content["b"]["value"] is content["c"]["value"]
+    # Frozen nodes are written like plain dicts and lists, shared ones as aliases
+    assert "!!python" not in repr(xyml_file)
+    assert "*id" in repr(xyml_file)
+    assert yaml.safe_load(repr(xyml_file)) == content
+    stream = io.StringIO()
+    xyml_file.dump(stream, aliases=False)
+    assert "*id" not in stream.getvalue()
+    assert yaml.safe_load(stream.getvalue()) == content
+
+
+def test_thaw_all():
+    shared = freeze({"b": [1, {"c": 2}]})
+    thawed = thaw_all({"a": shared, "d": [shared]})
+    assert thawed == {"a": {"b": [1, {"c": 2}]}, "d": [{"b": [1, {"c": 2}]}]}
+    assert type(thawed["a"]["b"][1]) is dict
+    # Every occurrence of a shared node becomes a copy of its own
+    assert thawed["a"] is not thawed["d"][0]
+
+
+def test_included_content_is_mutable(tmp_path):
+    (tmp_path / "inc.yaml").write_text("x: 0\nnested:\n  list: [1, 2]\n")
+    xyml_file = XYmlFile.from_string(
+        """
+inc:
+  xyml.include: inc.yaml
+other:
+  xyml.include: inc.yaml
+""",
+        include_dirs=[tmp_path],
+    )
+    content = xyml_file.content
+    assert yaml.safe_load(yaml.safe_dump(content)) == content
+    assert "!!python" not in yaml.dump(content)
+    content["inc"]["x"] = 1
+    content["inc"]["nested"]["list"].append(3)
+    assert content["other"] == {"x": 0, "nested": {"list": [1, 2]}}
+
+
+def test_render_frozen_artifact():
+    content = freeze({"shared": {"value": "{{xyml.param.value}}"}})
+    assert render(dumps(content), {"value": 1}) == {"shared": {"value": 1}}
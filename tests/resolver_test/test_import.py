@@ -0,0 +1,45 @@
+"""
+Startup benchmark, which keeps the import cost of yaml_extender in check
+"""
+
+import subprocess
+import sys
+
+# Generous limit for the cumulative import time of yaml_extender, dependencies excluded
+MAXIMUM_IMPORT_TIME_US = 100_000
+
+
+def import_times(statement: str) -> dict:
+    """Runs statement in a fresh interpreter and returns the cumulative import time per module"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement], capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        times[module.strip()] = int(cumulative)
+    return times
+
+
+def test_lazy_package_import():
+    times = import_times("import yaml_extender; from yaml_extender import yaml_loader, xyml_exception")
+    assert "yaml" not in times
+    assert not [m for m in times if m.startswith("yaml_extender.resolver")]
+    assert "yaml_extender.xyml_file" not in times
+    assert times["yaml_extender"] < MAXIMUM_IMPORT_TIME_US
+
+
+def test_lazy_cli_import():
+    times = import_times("import yaml_extender.cli")
+    assert "yaml" not in times
+    assert "yaml_extender.xyml_file" not in times
+    assert times["yaml_extender.cli"] < MAXIMUM_IMPORT_TIME_US
+
+
+def test_lazy_attribute():
+    import yaml_extender
+    from yaml_extender.xyml_file import XYmlFile
+
+    assert yaml_extender.XYmlFile is XYmlFile
@@ -351,3 +351,29 @@ xyml.include: inc.yaml<<param_value=true>>
     inc_resolver = IncludeResolver()
     result = inc_resolver.resolve(content)
     assert result == expected
+
+
+@mock.patch("yaml_extender.yaml_loader.load")
+@mock.patch("pathlib.Path.is_file")
+def test_cached_parameter_include(is_file_mock, load_func):
+    is_file_mock.return_value = True
+    content = yaml.safe_load(
+        """
+list_1:
+- xyml.include: inc.yaml<<name=a>>
+- xyml.include: inc.yaml<<name=b>>
+- xyml.include: inc.yaml<<name=a>>
+- xyml.include: inc.yaml<<name=a>>
+"""
+    )
+    load_func.side_effect = lambda *args, **kwargs: {"value": "{{name}}"}
+    inc_resolver = IncludeResolver()
+    result = inc_resolver.resolve(content)
+
+    assert result == {"list_1": [{"value": "a"}, {"value": "b"}, {"value": "a"}, {"value": "a"}]}
+    # The file is read once and every combination of parameters is only resolved once
+    assert load_func.call_count == 1
+    assert inc_resolver.include_count == 4
+    # Use sites share the frozen result
+    assert result["list_1"][0] is result["list_1"][2]
+    assert result["list_1"][0] is not result["list_1"][1]
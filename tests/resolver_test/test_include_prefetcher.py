@@ -0,0 +1,99 @@
+import asyncio
+import threading
+from pathlib import Path
+from unittest import mock
+
+import yaml
+
+from yaml_extender import yaml_loader
+from yaml_extender.resolver.include_prefetcher import IncludePrefetcher
+from yaml_extender.resolver.include_resolver import IncludeResolver
+from yaml_extender.xyml_file import XYmlFile
+
+script_dir = Path(__file__).parent
+res_dir = script_dir.parent / "resources"
+
+
+def write_includes(tmp_path: Path):
+    (tmp_path / "inc1.yaml").write_text("value_1: abc\nxyml.include: nested/inc2.yaml\n")
+    (tmp_path / "nested").mkdir()
+    (tmp_path / "nested" / "inc2.yaml").write_text("value_2: xyz\n")
+    (tmp_path / "inc3.yaml").write_text("value_3: 123\n")
+    return yaml.safe_load(
+        """
+inc_name: inc3
+dict_1:
+  xyml.include: inc1.yaml
+dict_2:
+  xyml.include: "{{inc_name}}.yaml"
+"""
+    )
+
+
+def test_prefetched_include(tmp_path):
+    content = write_includes(tmp_path)
+    loading_threads = {}
+    real_load = yaml_loader.load
+
+    def load(path, **kwargs):
+        loading_threads[Path(path).name] = threading.current_thread().name
+        return real_load(path, **kwargs)
+
+    with mock.patch("yaml_extender.yaml_loader.load", side_effect=load), IncludePrefetcher(2) as prefetcher:
+        inc_resolver = IncludeResolver([tmp_path], prefetcher=prefetcher)
+        prefetcher.scan(content, inc_resolver.include_dirs)
+        result = inc_resolver.resolve(content)
+
+    assert result == {
+        "inc_name": "inc3",
+        "dict_1": {"value_1": "abc", "value_2": "xyz"},
+        "dict_2": {"value_3": 123},
+    }
+    # Literal includes are read by the pool, includes containing references are read lazily
+    assert loading_threads["inc1.yaml"].startswith("xyml-prefetch")
+    assert loading_threads["inc2.yaml"].startswith("xyml-prefetch")
+    assert loading_threads["inc3.yaml"] == threading.current_thread().name
+
+
+def test_repeated_prefetched_include(tmp_path):
+    (tmp_path / "inc.yaml").write_text('value: "{{param}}"\n')
+    content = yaml.safe_load(
+        """
+dict_1:
+  xyml.include: inc.yaml<<param=1>>
+dict_2:
+  xyml.include: inc.yaml<<param=2>>
+"""
+    )
+    with IncludePrefetcher(2) as prefetcher:
+        inc_resolver = IncludeResolver([tmp_path], prefetcher=prefetcher)
+        prefetcher.scan(content, inc_resolver.include_dirs)
+        result = inc_resolver.resolve(content)
+    assert result == {"dict_1": {"value": 1}, "dict_2": {"value": 2}}
+
+
+def test_prefetch_file():
+    params = {"user": "simon", "empty": ""}
+    resolved_file = XYmlFile(res_dir / "root.yaml", params, [res_dir / "subdir"], prefetch_workers=4)
+    expected = yaml.safe_load((res_dir / "expected_file.yaml").read_text())
+    assert resolved_file.content == expected
+
+
+def test_async_load_shared_cache():
+    params = {"user": "simon", "empty": ""}
+    expected = yaml.safe_load((res_dir / "expected_file.yaml").read_text())
+    real_load = yaml_loader.load
+
+    async def load_all(prefetcher):
+        loads = [XYmlFile.aload(res_dir / "root.yaml", params, [res_dir / "subdir"], prefetcher) for _ in range(8)]
+        return await asyncio.gather(*loads)
+
+    with mock.patch("yaml_extender.yaml_loader.load", side_effect=real_load) as load_mock:
+        with IncludePrefetcher(4) as prefetcher:
+            results = asyncio.run(load_all(prefetcher))
+    assert all(result.content == expected for result in results)
+    # Each included file is read once, the root file once for every load
+    loaded_files = [Path(call[0][0]).name for call in load_mock.call_args_list]
+    assert loaded_files.count("exec.yaml") == 1
+    assert loaded_files.count("exec_test.yaml") == 1
+    assert loaded_files.count("root.yaml") == 8
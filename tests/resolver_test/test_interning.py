@@ -0,0 +1,51 @@
+from yaml_extender.frozen import FrozenDict
+from yaml_extender.interning import Interner
+from yaml_extender.xyml_file import XYmlFile
+
+
+def test_intern_subtrees():
+    content = {"items": [{"labels": {"team": "core", "tier": "gold"}, "index": i % 2} for i in range(4)]}
+    expected = {"items": [{"labels": {"team": "core", "tier": "gold"}, "index": i % 2} for i in range(4)]}
+    interner = Interner()
+    result = interner.intern(content)
+
+    assert result == expected
+    assert isinstance(result, FrozenDict)
+    items = result["items"]
+    assert items[0] is items[2]
+    assert items[0] is not items[1]
+    assert items[0]["labels"] is items[1]["labels"]
+    assert interner.duplicates > 0
+    assert interner.saved_bytes > 0
+    # Interning canonical content again finds no further duplicates
+    duplicates = interner.duplicates
+    assert interner.intern(result) is result
+    assert interner.duplicates == duplicates
+
+
+def test_intern_keeps_types():
+    result = Interner().intern([1, 1.0, True, "1", None, {"a": 1}, {"a": True}])
+    assert [type(x) for x in result[:5]] == [int, float, bool, str, type(None)]
+    assert result[6]["a"] is True
+
+
+def test_intern_content():
+    xyml_file = XYmlFile.from_string(
+        """
+values: [a, b, c]
+items:
+  xyml.for: value:values
+  labels:
+    team: core
+  name: "{{value}}"
+""",
+        collect_stats=True,
+        intern_content=True,
+    )
+    items = xyml_file.content["items"]
+    assert [x["name"] for x in items] == ["a", "b", "c"]
+    assert items[0]["labels"] is items[2]["labels"]
+    stats = xyml_file.stats.as_dict()
+    assert stats["interned_duplicates"] > 0
+    assert stats["interned_bytes"] > 0
+    assert "intern" in stats["stage_times"]
@@ -0,0 +1,66 @@
+import pytest
+
+from yaml_extender.limits import ResolveLimits
+from yaml_extender.xyml_exception import IncludeCycleError, ResourceLimitError
+from yaml_extender.xyml_file import XYmlFile
+
+LOOP_TEXT = """
+values: [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+items:
+  xyml.for: x:values, y:values, z:values
+  value: "{{x}}-{{y}}-{{z}}"
+"""
+
+
+def test_max_nodes():
+    with pytest.raises(ResourceLimitError) as error:
+        XYmlFile.from_string(LOOP_TEXT, limits=ResolveLimits(max_nodes=100))
+    assert "xyml.for: x:values, y:values, z:values" in error.value.message
+    xyml_file = XYmlFile.from_string(LOOP_TEXT, limits=ResolveLimits(max_nodes=2000))
+    assert len(xyml_file.content["items"]) == 1000
+
+
+def test_timeout():
+    with pytest.raises(ResourceLimitError) as error:
+        XYmlFile.from_string(LOOP_TEXT, limits=ResolveLimits(timeout=0))
+    assert "timeout" in error.value.message
+
+
+def test_include_cycle(tmp_path):
+    (tmp_path / "a.yaml").write_text("a: 1\nxyml.include: b.yaml\n")
+    (tmp_path / "b.yaml").write_text("b: 1\nxyml.include: a.yaml\n")
+    with pytest.raises(IncludeCycleError) as error:
+        XYmlFile(tmp_path / "a.yaml")
+    assert error.value.message == "Include cycle detected: a.yaml -> b.yaml -> a.yaml"
+
+
+def test_include_cycle_relative_path(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "a.yaml").write_text("a: 1\nxyml.include: b.yaml\n")
+    (tmp_path / "b.yaml").write_text("b: 1\nxyml.include: sub/../a.yaml\n")
+    with pytest.raises(IncludeCycleError) as error:
+        XYmlFile(tmp_path / "a.yaml", limits=ResolveLimits(max_include_depth=10))
+    assert error.value.message == "Include cycle detected: a.yaml -> b.yaml -> sub/../a.yaml"
+
+
+def test_include_parameters_no_cycle(tmp_path):
+    (tmp_path / "a.yaml").write_text("list:\n- xyml.include: b.yaml<<n=1>>\n- xyml.include: b.yaml<<n=2>>\n")
+    (tmp_path / "b.yaml").write_text("value: '{{n}}'\n")
+    assert XYmlFile(tmp_path / "a.yaml").content == {"list": [{"value": 1}, {"value": 2}]}
+
+
+def test_max_include_depth(tmp_path):
+    (tmp_path / "a.yaml").write_text("xyml.include: b.yaml\n")
+    (tmp_path / "b.yaml").write_text("xyml.include: c.yaml\n")
+    (tmp_path / "c.yaml").write_text("c: 1\n")
+    assert XYmlFile(tmp_path / "a.yaml", limits=ResolveLimits(max_include_depth=2)).content == {"c": 1}
+    with pytest.raises(ResourceLimitError) as error:
+        XYmlFile(tmp_path / "a.yaml", limits=ResolveLimits(max_include_depth=1))
+    assert "c.yaml" in error.value.message
+
+
+def test_max_output_bytes(tmp_path):
+    xyml_file = XYmlFile.from_string(LOOP_TEXT, limits=ResolveLimits(max_output_bytes=1000))
+    with pytest.raises(ResourceLimitError):
+        xyml_file.save(tmp_path / "output.yaml")
+    assert not (tmp_path / "output.yaml").exists()
@@ -247,3 +247,78 @@ commands:
     loop_resolver = LoopResolver()
     result = loop_resolver.resolve(content)
     assert result == expected
+
+
+def test_iter_loop_lazy():
+    config = {"a": list(range(100)), "b": list(range(100)), "c": list(range(100))}
+    loop_config = {"xyml.for": "x:a, y:b, z:c", "value": "{{x}}-{{y}}-{{z}}"}
+    items = LoopResolver().iter_loop(loop_config["xyml.for"], loop_config, config)
+    # Items are expanded on demand, without materializing the whole product
+    assert next(items) == {"value": "0-0-0"}
+    assert next(items) == {"value": "0-0-1"}
+    assert [next(items) for _ in range(98)][-1] == {"value": "0-0-99"}
+    assert next(items) == {"value": "0-1-0"}
+
+
+def test_loop_hoisted_references():
+    content = yaml.safe_load(
+        """
+settings:
+  host: example.com
+  port: 8080
+item: global
+outer_list: [a, b]
+inner_list: [1, 2]
+commands:
+  xyml.for: item:outer_list
+  values:
+    xyml.for: i:inner_list
+    url: "{{settings.host}}:{{settings.port}}/{{item}}/{{i}}"
+    port: "{{settings.port}}"
+"""
+    )
+    loop_resolver = LoopResolver()
+    result = loop_resolver.resolve(content)
+    assert result["commands"] == [
+        {"values": [{"url": f"example.com:8080/{item}/{i}", "port": 8080} for i in [1, 2]]} for item in ["a", "b"]
+    ]
+    # Resolved once before the inner loop, the enclosing iterator is not taken from the document
+    assert loop_resolver.hoisted_count == 3
+
+
+def test_loop_hoisted_expressions():
+    content = yaml.safe_load(
+        """
+base: 8000
+step: 10
+indices: [0, 1, 2]
+ports:
+  xyml.for: idx:indices
+  port: "{{idx * step + base}}"
+  offset: "{{base - step}}"
+"""
+    )
+    loop_resolver = LoopResolver()
+    result = loop_resolver.resolve(content)
+    assert result["ports"] == [{"port": 8000 + i * 10, "offset": 7990} for i in range(3)]
+    # step and base are substituted once, only idx is evaluated per item
+    assert loop_resolver.hoisted_count == 2
+
+
+def test_loop_shared_body():
+    content = yaml.safe_load(
+        """
+step: 10
+indices: [0, 1]
+base: &body
+  port: "{{idx * step}}"
+  step: "{{step}}"
+items:
+  xyml.for: idx:indices
+  xyml.content: *body
+"""
+    )
+    result = LoopResolver().resolve(content)
+    assert result["items"] == [{"port": 0, "step": 10}, {"port": 10, "step": 10}]
+    # The body is shared with base by the yaml alias, hoisting must not modify it
+    assert result["base"] == {"port": "{{idx * step}}", "step": "{{step}}"}
@@ -0,0 +1,60 @@
+import pytest
+
+from yaml_extender import parallel
+from yaml_extender.limits import ResolveLimits
+from yaml_extender.parallel import can_resolve_parallel
+from yaml_extender.xyml_exception import ResourceLimitError
+from yaml_extender.xyml_file import XYmlFile
+import yaml_extender.yaml_loader as yaml_loader
+
+DOCUMENT = """
+ports: [80, 443]
+names: [web, db]
+base: 8000
+web:
+  peer: "{{db.name}}"
+  host: "{{xyml.param.host}}"
+  listen:
+    xyml.for: port:ports
+    address: "{{xyml.param.host}}:{{port}}"
+db:
+  name: database
+  replicas:
+    xyml.for: name:names, port:ports
+    id: "{{name}}-{{port}}-{{base}}"
+  banner: "{{xyml.for:name:names:{{name}} }}"
+first_port: "{{web.listen.0.address}}"
+"""
+
+
+@pytest.mark.parametrize("free_threaded", [False, True])
+def test_parallel_equals_serial(monkeypatch, free_threaded):
+    monkeypatch.setattr(parallel, "is_free_threaded", lambda: free_threaded)
+    expected = XYmlFile.from_string(DOCUMENT, {"host": "example"}, collect_stats=True)
+    xyml_file = XYmlFile.from_string(DOCUMENT, {"host": "example"}, parallel_workers=2, collect_stats=True)
+    assert xyml_file.content == expected.content
+    assert xyml_file.content["web"]["peer"] == "database"
+    assert xyml_file.content["first_port"] == "example:80"
+    assert xyml_file.stats.loops_expanded == expected.stats.loops_expanded
+
+
+def test_parallel_serial_fallback():
+    text = """
+values: [1, 2]
+derived:
+  - xyml.for: x:values
+    value: "{{x}}"
+items:
+  xyml.for: d:derived
+  copy: "{{d}}"
+"""
+    assert not can_resolve_parallel(yaml_loader.parse(text))
+    assert can_resolve_parallel(yaml_loader.parse(DOCUMENT))
+    expected = XYmlFile.from_string(text).content
+    assert XYmlFile.from_string(text, parallel_workers=2).content == expected
+
+
+def test_parallel_limits():
+    with pytest.raises(ResourceLimitError) as error:
+        XYmlFile.from_string(DOCUMENT, {"host": "h"}, parallel_workers=2, limits=ResolveLimits(max_nodes=4))
+    assert error.value.statement == "xyml.for: name:names, port:ports"
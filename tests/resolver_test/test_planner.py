@@ -0,0 +1,73 @@
+from pathlib import Path
+
+import pytest
+
+from yaml_extender import cli
+from yaml_extender.limits import count_nodes
+from yaml_extender.planner import plan, plan_file
+from yaml_extender.xyml_file import XYmlFile
+from yaml_extender.xyml_exception import IncludeCycleError
+import yaml_extender.yaml_loader as yaml_loader
+
+PLAN_TEXT = """
+values: [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+services: [web, db]
+items:
+  xyml.for: x:values, y:values, z:values
+  value: "{{x}}-{{y}}-{{z}}"
+servers:
+  xyml.for: service:services
+  xyml.content:
+    name: "{{service}}"
+    ports:
+      xyml.for: port:values
+      port: "{{port}}"
+"""
+
+
+def test_plan_estimate():
+    expansion_plan = plan(yaml_loader.parse(PLAN_TEXT))
+    assert expansion_plan.nodes == count_nodes(XYmlFile.from_string(PLAN_TEXT).content)
+    assert expansion_plan.references == 3000 + 2 + 20
+    assert [(x.path, x.factor, x.nodes) for x in expansion_plan.hotspots(2)] == [
+        ("items", 1000, 2000),
+        ("servers", 2, 46),
+    ]
+
+
+def test_plan_unknown_list():
+    expansion_plan = plan({"items": {"xyml.for": "x:missing", "value": "{{x}}"}})
+    assert expansion_plan.loops[0].factor is None
+    assert "?" in expansion_plan.format()
+
+
+def test_plan_includes(tmp_path):
+    (tmp_path / "a.yaml").write_text("values: [1, 2]\nitems:\n  xyml.for: x:values\n  xyml.include: b.yaml\n")
+    (tmp_path / "b.yaml").write_text("value: '{{x}}'\n")
+    expansion_plan = plan_file(tmp_path / "a.yaml")
+    assert expansion_plan.includes == 1
+    assert expansion_plan.references == 2
+    assert expansion_plan.nodes == count_nodes(XYmlFile(tmp_path / "a.yaml").content)
+
+
+def test_plan_include_cycle(tmp_path, monkeypatch):
+    (tmp_path / "a.yaml").write_text("values:\n  xyml.include: b.yaml\n")
+    (tmp_path / "b.yaml").write_text("values:\n  xyml.include: a.yaml\n")
+    (tmp_path / "self.yaml").write_text("values:\n  xyml.include: self.yaml\n")
+    monkeypatch.chdir(tmp_path)
+    # The planned file, given by a relative path, is the start of the cycle
+    with pytest.raises(IncludeCycleError) as error:
+        plan_file(Path("a.yaml"))
+    assert error.value.chain == ["a.yaml", "b.yaml", "a.yaml"]
+    with pytest.raises(IncludeCycleError) as error:
+        plan_file(Path("self.yaml"))
+    assert error.value.chain == ["self.yaml", "self.yaml"]
+
+
+def test_plan_cli(tmp_path, capsys):
+    (tmp_path / "a.yaml").write_text(PLAN_TEXT)
+    assert cli.main(["plan", str(tmp_path / "a.yaml"), "--top", "1"]) == 0
+    output = capsys.readouterr().out
+    assert "Estimated nodes:      2,063" in output
+    assert "x1,000  items: xyml.for: x:values, y:values, z:values" in output
+    assert "servers" not in output
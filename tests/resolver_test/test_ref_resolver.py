@@ -530,3 +530,84 @@ def test_dict_list_ref(loader_mock):
     """
     )
     assert file.content == expected
+
+
+def test_arithmetic_expressions():
+    content = yaml.safe_load(
+        """
+value_1: 10
+value_2: "4"
+chained: "{{value_1}}"
+difference: "{{value_1 - 1}}"
+quotient: "{{value_1 / 4}}"
+precedence: "{{value_1 + value_2 * 2}}"
+parentheses: "{{(value_1 + value_2) * 2}}"
+chain: "port-{{chained * 10 + 8000}}"
+modulo: "{{value_1 % value_2 // 1}}"
+negative: "{{-value_1 + 1}}"
+default: "{{missing * 2:5}}"
+"""
+    )
+    result = ReferenceResolver().resolve(content)
+    assert result["difference"] == 9
+    assert result["quotient"] == 2.5
+    assert result["precedence"] == 18
+    assert result["parentheses"] == 28
+    assert result["chain"] == "port-8100"
+    assert result["modulo"] == 2
+    assert result["negative"] == -9
+    assert result["default"] == 5
+
+
+def test_arithmetic_partial_evaluation():
+    content = {"value": "{{i * 2 + offset}}"}
+    result = ReferenceResolver(False, partial_expressions=True).resolve(content, {"i": 3})
+    assert result == {"value": "{{3 * 2 + offset}}"}
+    assert ReferenceResolver().resolve(result, {"offset": 1}) == {"value": 7}
+    # Expressions, which cannot be evaluated completely, are kept unchanged by default
+    assert ReferenceResolver(False).resolve(content, {"i": 3}) == content
+
+
+def test_keys_with_operator_characters():
+    content = yaml.safe_load(
+        """
+app/name: web
+a*b: 3
+x+y: 4
+a: 2
+b: 5
+indices: [0, 1]
+v1: "{{app/name}}"
+v2: "{{a*b}}"
+v3: "{{x+y}}"
+v4: "{{a * b}}"
+items:
+  xyml.for: idx:indices
+  xyml.content: "{{app/name}}-{{a*b}}-{{idx+a}}"
+"""
+    )
+    result = XYmlFile.from_content(content, select=["v1", "v2", "v3", "v4", "items"]).content
+    # Existing keys take precedence over expressions
+    assert [result["v1"], result["v2"], result["v3"]] == ["web", 3, 4]
+    assert result["v4"] == 10
+    assert result["items"] == ["web-3-2", "web-3-3"]
+    assert XYmlFile.from_content(content).content["items"] == ["web-3-2", "web-3-3"]
+
+
+def test_arithmetic_unresolvable_expression():
+    content = yaml.safe_load(
+        """
+a: 1
+indices: [0, 1]
+constant: "{{offset + 3 * 2}}"
+mixed: "value {{a + offset}}"
+items:
+  xyml.for: idx:indices
+  xyml.content: "{{idx * a + offset}}"
+"""
+    )
+    result = XYmlFile.from_content(content).content
+    assert result["constant"] == "{{offset + 3 * 2}}"
+    assert result["mixed"] == "value {{a + offset}}"
+    # The iterator is unknown after the loop, only its value is substituted
+    assert result["items"] == ["{{0 * a + offset}}", "{{1 * a + offset}}"]
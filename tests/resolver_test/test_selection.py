@@ -0,0 +1,95 @@
+import pytest
+
+from yaml_extender import cli
+from yaml_extender.selection import dependencies, parse_path, prune
+from yaml_extender.xyml_exception import ReferenceNotFoundError
+from yaml_extender.xyml_file import XYmlFile
+import yaml_extender.yaml_loader as yaml_loader
+
+DOCUMENT = """
+versions: {nginx: "1.25", postgres: "16"}
+ports: [80, 443]
+base: 8000
+services:
+  web:
+    xyml.include: web.yaml
+    listen:
+      xyml.for: port:ports
+      address: "{{host}}:{{port * 10}}"
+  db:
+    xyml.include: missing.yaml
+host: "{{xyml.param.host}}"
+huge:
+  xyml.for: a:ports, b:ports
+  value: "{{a}}-{{b}}"
+"""
+
+
+@pytest.fixture
+def document(tmp_path):
+    (tmp_path / "a.yaml").write_text(DOCUMENT)
+    (tmp_path / "web.yaml").write_text("image: 'nginx:{{versions.nginx}}'\n")
+    return tmp_path / "a.yaml"
+
+
+def test_select(document):
+    xyml_file = XYmlFile(document, {"host": "example"}, select=["services.web"], collect_stats=True)
+    assert xyml_file.content == {
+        "services": {
+            "web": {
+                "listen": [{"address": "example:800"}, {"address": "example:4430"}],
+                "image": "nginx:1.25",
+            }
+        }
+    }
+    # Neither missing.yaml is read nor huge is expanded
+    assert xyml_file.stats.includes_read == 1
+    assert xyml_file.stats.loops_expanded == 1
+
+
+def test_select_multiple(document):
+    xyml_file = XYmlFile(document, {"host": "h"}, select=["versions.postgres", "host"])
+    assert xyml_file.content == {"versions": {"postgres": "16"}, "host": "h"}
+
+
+def test_select_missing(document):
+    with pytest.raises(ReferenceNotFoundError):
+        XYmlFile(document, select=["services.cache"])
+
+
+def test_prune_and_dependencies():
+    content = yaml_loader.parse(DOCUMENT)
+    pruned = prune(content, {parse_path("services.web")})
+    assert list(pruned) == ["services"]
+    assert list(pruned["services"]) == ["web"]
+    # A key named like the expression is kept as well
+    assert set(dependencies(pruned)) == {("ports",), ("host",), ("port",), ("port * 10",)}
+
+
+def test_select_cli(document, capsys):
+    assert cli.main([str(document), "-", "--select", "versions", "-q"]) == 0
+    assert yaml_loader.parse(capsys.readouterr().out) == {"versions": {"nginx": "1.25", "postgres": "16"}}
+
+
+def test_select_into_list(document):
+    xyml_file = XYmlFile(document, {"host": "h"}, select=["services.web.listen.1"])
+    assert xyml_file.content == {"services": {"web": {"listen": [{"address": "h:800"}, {"address": "h:4430"}]}}}
+
+
+@pytest.mark.parametrize(
+    "path, output",
+    [
+        ("services.web.listen.1.address", "example:4430\n"),
+        ("base", "8000\n"),
+        ("services.web.listen.address", "- example:800\n- example:4430\n"),
+    ],
+)
+def test_get_cli(document, capsys, path, output):
+    assert cli.main(["get", str(document), path, "--host", "example"]) == 0
+    assert capsys.readouterr().out == output
+
+
+def test_get_cli_json(document, capsys):
+    assert cli.main(["get", str(document), "services.web", "--format", "json", "--host", "h"]) == 0
+    assert capsys.readouterr().out.startswith('{\n  "listen": [\n')
+    assert cli.main(["get", str(document), "services.cache"]) == 1
@@ -0,0 +1,83 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from yaml_extender.frozen import freeze
+from yaml_extender.interning import Interner
+from yaml_extender.logger import LOGGER, init_basic_logger
+from yaml_extender.resolver.include_prefetcher import IncludePrefetcher
+from yaml_extender.xyml_file import XYmlFile
+import yaml_extender.yaml_loader as yaml_loader
+
+THREADS = 16
+ROUNDS = 8
+
+DOCUMENT = """
+ports: [80, 443, 8080]
+services:
+  xyml.for: name:names
+  xyml.content:
+    name: "{{name}}"
+    listen:
+      xyml.for: port:ports
+      address: "{{xyml.param.host}}:{{port}}"
+    common:
+      xyml.include: common.yaml<<service={{name}}>>
+banner: "{{xyml.for:name:names:{{name}} }}"
+names: [web, db, cache]
+"""
+
+
+def test_concurrent_resolution(tmp_path):
+    (tmp_path / "common.yaml").write_text("label: '{{service}}'\nlimits: {cpu: 2, memory: 512}\n")
+    fragment = yaml_loader.parse(DOCUMENT)
+    original = yaml_loader.parse(DOCUMENT)
+    params = {"host": "localhost"}
+    expected = XYmlFile.from_content(yaml_loader.parse(DOCUMENT), params, root_dir=tmp_path).content
+
+    with IncludePrefetcher(4) as prefetcher:
+        interner = Interner()
+        options = {"root_dir": tmp_path, "prefetcher": prefetcher, "thread_safe": True}
+
+        def resolve(_):
+            xyml_file = XYmlFile.from_content(fragment, params, **options)
+            xyml_file.intern(interner)
+            return xyml_file.content
+
+        with ThreadPoolExecutor(THREADS) as executor:
+            results = list(executor.map(resolve, range(THREADS * ROUNDS)))
+    assert all(result == expected for result in results)
+    # Interning shared between the threads yields one canonical instance
+    assert all(result is results[0] for result in results)
+    # The shared fragment and parameters were not modified
+    assert fragment == original
+    assert params == {"host": "localhost"}
+
+
+def test_thread_safe_frozen_fragment():
+    fragment = freeze(yaml_loader.parse(DOCUMENT.replace("xyml.include", "include")))
+    xyml_file = XYmlFile.from_content(fragment, {"host": "h"}, thread_safe=True)
+    assert xyml_file.content["services"][1]["listen"][2] == {"address": "h:8080"}
+    assert fragment["services"]["xyml.for"] == "name:names"
+
+
+def test_concurrent_logger_init():
+    level, handlers = LOGGER.level, list(LOGGER.handlers)
+    for handler in [h for h in handlers if type(h) is logging.StreamHandler]:
+        LOGGER.removeHandler(handler)
+    barrier = threading.Barrier(THREADS)
+
+    def init():
+        barrier.wait()
+        init_basic_logger(logging.WARNING)
+
+    threads = [threading.Thread(target=init) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    try:
+        assert len([h for h in LOGGER.handlers if type(h) is logging.StreamHandler]) == 1
+    finally:
+        LOGGER.handlers = handlers
+        LOGGER.setLevel(level)
@@ -1,10 +1,16 @@
 """
 Component Tests to test overall functionality of yaml_extender
 """
+
+import json
+import logging
+import os
+
 import yaml
 from pathlib import Path
 
-from yaml_extender.xyml_file import XYmlFile
+from yaml_extender.tracing import Tracer
+from yaml_extender.xyml_file import XYmlFile, reference_config
 
 script_dir = Path(__file__).parent
 res_dir = script_dir.parent / "resources"
@@ -14,3 +20,195 @@ def test_reference_file():
     resolved_file = XYmlFile(res_dir / "root.yaml", {"user": "simon", "empty": ""}, [res_dir / "subdir"])
     expected = yaml.safe_load((res_dir / "expected_file.yaml").read_text())
     assert resolved_file.content == expected
+
+
+def test_resolve_stats(tmp_path):
+    resolved_file = XYmlFile(
+        res_dir / "root.yaml", {"user": "simon", "empty": ""}, [res_dir / "subdir"], collect_stats=True
+    )
+    resolved_file.save(tmp_path / "output.yaml")
+    stats = resolved_file.stats.as_dict()
+    assert set(stats["stage_times"]) == {"load", "include", "loop", "inline_loop", "reference", "dump"}
+    assert stats["includes_read"] == 2
+    # Two loops in each included file, one in root.yaml and one inline loop
+    assert stats["loops_expanded"] == 6
+    assert stats["references_resolved"] > 0
+    assert stats["nodes_visited"] > 0
+    assert stats["max_include_depth"] == 1
+
+
+def test_stats_disabled():
+    resolved_file = XYmlFile(res_dir / "root.yaml", {"user": "simon", "empty": ""}, [res_dir / "subdir"])
+    assert resolved_file.stats is None
+
+
+def test_trace(tmp_path):
+    tracer = Tracer(slow_reference_threshold=0)
+    XYmlFile(res_dir / "root.yaml", {"user": "simon", "empty": ""}, [res_dir / "subdir"], tracer=tracer)
+    tracer.save(tmp_path / "trace.json")
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    names = [event["name"] for event in events if event["cat"] != "stage"]
+    assert all(event["ph"] == "X" for event in events)
+    assert names.count("include") == 2
+    assert names.count("nested include") == 2
+    assert names.count("parameters") == 2
+    assert names.count("read") == names.count("parse") == 3
+    assert names.count("loop") == 5
+    assert "inline loop" in names
+    assert "reference" in names
+    # Spans of an include are nested within the include span
+    include = next(event for event in events if event["name"] == "include")
+    parameters = next(event for event in events if event["name"] == "parameters")
+    assert include["ts"] <= parameters["ts"] <= include["ts"] + include["dur"]
+
+
+def test_logging_summary(caplog):
+    with caplog.at_level(logging.INFO, logger="xyaml_parser"):
+        XYmlFile(res_dir / "root.yaml", {"user": "simon", "empty": ""}, [res_dir / "subdir"])
+    assert "2 includes, 5 loops, 1 inline loops" in caplog.text
+    # Single includes are only reported on debug level
+    assert "Resolving include" not in caplog.text
+
+
+def test_save_json(tmp_path):
+    resolved_file = XYmlFile(res_dir / "root.yaml", {"user": "simon", "empty": ""}, [res_dir / "subdir"])
+    resolved_file.save(tmp_path / "output.json", sort_keys=True, output_format="json")
+    text = (tmp_path / "output.json").read_text()
+    assert json.loads(text) == resolved_file.content
+    assert text.index('"customer"') < text.index('"todos"')
+    resolved_file.save(tmp_path / "output.yaml", output_format="yaml")
+    assert yaml.safe_load((tmp_path / "output.yaml").read_text()) == resolved_file.content
+
+
+def test_save_anchors(tmp_path):
+    resolved_file = XYmlFile.from_string(
+        """
+values: [a, b, c]
+items:
+  xyml.for: value:values
+  name: "{{value}}"
+  labels: {team: core, tier: gold, owner: ops}
+"""
+    )
+    resolved_file.save(tmp_path / "output.yaml", anchor_min_size=4)
+    text = (tmp_path / "output.yaml").read_text()
+    assert text.count("&id") == 1
+    assert text.count("*id") == 2
+    assert yaml.safe_load(text) == resolved_file.content
+    # Smaller subtrees are written in full
+    resolved_file.save(tmp_path / "output.yaml", anchor_min_size=5)
+    assert "&id" not in (tmp_path / "output.yaml").read_text()
+
+
+def test_save_only_if_changed(tmp_path):
+    output = tmp_path / "output.yaml"
+    resolved_file = XYmlFile(res_dir / "root.yaml", {"user": "simon", "empty": ""}, [res_dir / "subdir"])
+    assert resolved_file.save(output, only_if_changed=True)
+    os.utime(output, ns=(0, 0))
+    assert not resolved_file.save(output, only_if_changed=True)
+    assert output.stat().st_mtime_ns == 0
+    resolved_file.content["customer"] = "someone"
+    assert resolved_file.save(output, only_if_changed=True)
+    assert output.stat().st_mtime_ns != 0
+    assert yaml.safe_load(output.read_text())["customer"] == "someone"
+    assert [p.name for p in tmp_path.iterdir()] == ["output.yaml"]
+
+
+def test_cli_write_if_changed(tmp_path, caplog):
+    from yaml_extender import cli
+
+    output = tmp_path / "output.yaml"
+    argv = [str(res_dir / "root.yaml"), str(output), "-i", str(res_dir / "subdir"), "--user", "simon", "--empty", ""]
+    with caplog.at_level(logging.INFO, logger="xyaml_parser"):
+        assert cli.main(argv + ["--write-if-changed"]) == 0
+        assert f"Output {output} written" in caplog.text
+        os.utime(output, ns=(0, 0))
+        assert cli.main(argv + ["--write-if-changed"]) == 0
+    assert output.stat().st_mtime_ns == 0
+    assert f"Output {output} unchanged, not written" in caplog.text
+
+
+def test_from_string():
+    text = (res_dir / "root.yaml").read_text()
+    params = {"user": "simon", "empty": ""}
+    resolved_file = XYmlFile.from_string(text, params, [res_dir / "subdir"], root_dir=res_dir)
+    expected = yaml.safe_load((res_dir / "expected_file.yaml").read_text())
+    assert resolved_file.content == expected
+    assert resolved_file.filepath is None
+
+    with open(res_dir / "root.yaml") as stream:
+        resolved_file = XYmlFile.from_stream(stream, params, [res_dir, res_dir / "subdir"])
+    assert resolved_file.content == expected
+
+
+def test_reference_config_layers():
+    content = {"value": 1, "xyml": "document"}
+    config = reference_config(content, {"param": 2})
+    # Runtime values are layered over the document, which is not copied
+    assert config["value"] == 1
+    assert config["xyml"]["param"] == {"param": 2}
+    assert config["xyml"]["env"] is os.environ
+    assert content == {"value": 1, "xyml": "document"}
+    content["added"] = 3
+    assert config["added"] == 3
+
+
+def test_cli_stats(tmp_path, capsys):
+    from yaml_extender import cli
+
+    (tmp_path / "inc.yaml").write_text("name: '{{name}}'\n")
+    (tmp_path / "root.yaml").write_text(
+        """
+items: [1, 2, 3, 4]
+a:
+  xyml.include: inc.yaml<<name=x>>
+b:
+  xyml.include: inc.yaml<<name=x>>
+c:
+  xyml.include: inc.yaml<<name=y>>
+list:
+  xyml.for: item:items
+  xyml.content: "item {{item}}"
+"""
+    )
+    assert cli.main([str(tmp_path / "root.yaml"), str(tmp_path / "out.yaml"), "--stats", "-q"]) == 0
+    stats = json.loads(capsys.readouterr().out)
+    # The file is read once, the include with equal parameters is reused
+    assert stats["includes_read"] == 2
+    assert stats["includes_resolved"] == 3
+    assert stats["loops_expanded"] == 1
+    # Two include parameters and one iterator per loop item
+    assert stats["references_resolved"] == 6
+
+
+def test_save_aliases(tmp_path):
+    resolved_file = XYmlFile.from_string(
+        """
+labels: [a, b]
+indices: [0, 1, 2]
+items:
+  xyml.for: idx:indices
+  labels: "{{labels}}"
+"""
+    )
+    # Subtrees shared by reference are written once, like by yaml.dump
+    resolved_file.save(tmp_path / "output.yaml")
+    text = (tmp_path / "output.yaml").read_text()
+    assert text == yaml.dump(resolved_file.content, sort_keys=False)
+    assert text.count("*id001") == 3
+    resolved_file.save(tmp_path / "output.yaml", aliases=False)
+    text = (tmp_path / "output.yaml").read_text()
+    assert "*id" not in text
+    assert yaml.safe_load(text) == resolved_file.content
+
+
+def test_cli_format(tmp_path):
+    from yaml_extender import cli
+
+    output = tmp_path / "output.json"
+    argv = [str(res_dir / "root.yaml"), str(output), "-i", str(res_dir / "subdir"), "--user", "simon", "--empty", ""]
+    # The suffix does not select the format
+    assert cli.main(argv) == 0
+    assert not output.read_text().startswith("{")
+    assert cli.main(argv + ["--format", "json"]) == 0
+    assert json.loads(output.read_text()) == yaml.safe_load((res_dir / "expected_file.yaml").read_text())